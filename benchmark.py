@@ -0,0 +1,265 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+# Run the game module without a window
+os.environ['SKIBIDI_HEADLESS'] = '1'
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+os.environ['SDL_AUDIODRIVER'] = 'dummy'
+
+import numpy as np
+import pygame
+
+import main as game_module
+
+SEED = 1234
+WARMUP_TICKS = 120
+ALLOC_BUDGET = 4096  # Bytes allocated per traced frame at p95; hot paths should stay well under this
+ENTITY_COUNT = 1000
+
+# Scenario setups: each takes a fresh Game and puts it in the state to measure
+def setup_title(game):
+    game.game_state = game_module.TITLE_SCREEN
+
+def start_at_wave(game, wave):
+    game.current_wave = wave
+    game.game_state = game_module.WAVE_ANNOUNCEMENT
+    game.start_wave(wave)
+    if game.game_state == game_module.WAVE_ANNOUNCEMENT:
+        game.game_state = game_module.PLAYING  # Skip the banner
+
+def setup_wave_3(game):
+    start_at_wave(game, 3)
+
+def setup_wave_9(game):
+    # Wave 9 spawns min(3, 1 + 9 // 4) = 3 toilets at a time, the most any wave does
+    start_at_wave(game, 9)
+
+def setup_boss(game):
+    start_at_wave(game, 5)
+
+def setup_super_boss(game):
+    start_at_wave(game, 10)
+
+def setup_victory(game):
+    game.current_wave = 10
+    game.game_state = game_module.VICTORY
+    game.victory_timer = 0
+    game.victory_stage = 0
+    game.shrek.victory_x = game.shrek.x
+    game.shrek.victory_y = game.shrek.y
+
+# name -> (setup, scripted input, keep Shrek alive)
+SCENARIOS = {
+    'title_idle': (setup_title, None, False),
+    'wave_3': (setup_wave_3, 'demo', True),
+    'wave_9_max_spawn': (setup_wave_9, 'demo', True),
+    'boss': (setup_boss, 'demo', True),
+    'super_boss': (setup_super_boss, 'demo', True),
+    'victory': (setup_victory, None, False),
+}
+
+def make_input(kind):
+    if kind == 'demo':
+        return game_module.ScriptedInput.demo()
+    return game_module.ScriptedInput([(1, (), ())])  # Nothing pressed
+
+def new_game(name):
+    setup, input_kind, invincible = SCENARIOS[name]
+    game_module.RNG.seed(SEED)
+    game_module.PROJECTILE_POOL.clear()
+    game_module.ANIMATION_CLOCK.time_ms = 0
+    game = game_module.Game(interpolate=True)
+    setup(game)
+    return game, make_input(input_kind), invincible
+
+def step(game, input_source, invincible):
+    if invincible:
+        game.shrek.health = 80  # Keep the scenario from ending in GAME_OVER
+    game_module.run_tick(game, input_source)
+
+def percentiles(values):
+    values = np.asarray(values, dtype=float)
+    return {
+        'p50': float(np.percentile(values, 50)),
+        'p95': float(np.percentile(values, 95)),
+        'p99': float(np.percentile(values, 99)),
+        'mean': float(values.mean()),
+        'max': float(values.max()),
+    }
+
+def time_scenario(name, frames, view):
+    game, input_source, invincible = new_game(name)
+    screen = game_module.screen
+    for _ in range(WARMUP_TICKS):
+        step(game, input_source, invincible)
+
+    update_ms = []
+    draw_ms = []
+    entities = []
+    for _ in range(frames):
+        start = time.perf_counter()
+        step(game, input_source, invincible)
+        middle = time.perf_counter()
+        view.draw(screen, game)
+        view.present()
+        end = time.perf_counter()
+        update_ms.append((middle - start) * 1000)
+        draw_ms.append((end - middle) * 1000)
+        entities.append(len(game.enemies) + (1 if game.boss else 0) + game_module.PROJECTILE_POOL.count)
+    return {'update_ms': percentiles(update_ms), 'draw_ms': percentiles(draw_ms),
+            'entities': percentiles(entities), 'final_state': game.game_state}
+
+def measure_allocations(name, frames, view):
+    # Separate pass: tracing slows everything down, so it must not overlap the timings.
+    # Only the Python heap is traced; Surface pixels live in SDL, so tests/test_alloc_budget.py
+    # counts new Surfaces per frame as well.
+    game, input_source, invincible = new_game(name)
+    screen = game_module.screen
+    for _ in range(WARMUP_TICKS):
+        step(game, input_source, invincible)
+
+    allocated = []
+    tracemalloc.start()
+    try:
+        for _ in range(frames):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            step(game, input_source, invincible)
+            view.draw(screen, game)
+            view.present()
+            allocated.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+    return percentiles(allocated)
+
+# Entity constructors for the per-object memory report
+ENTITIES = {
+    'SkibidiToilet': lambda: game_module.SkibidiToilet(),
+    'FastSkibidi': lambda: game_module.FastSkibidi(),
+    'GunnerSkibidi': lambda: game_module.GunnerSkibidi(),
+    'SkibidiBoss': lambda: game_module.SkibidiBoss(),
+    'Onion': lambda: game_module.Onion(400, 300),
+    'FartCloud': lambda: game_module.FartCloud(400, 300),
+    'AttackAnimation': lambda: game_module.AttackAnimation(300, 300, 'punch', True),
+    'Donkey': lambda: game_module.Donkey(300, 300),
+    'Shrek': lambda: game_module.Shrek(),
+}
+
+def measure_entities(count):
+    # Bytes per live object, including the values it owns but not shared sprites
+    game_module.RNG.seed(SEED)
+    sizes = {}
+    for name, create in ENTITIES.items():
+        create()  # Fill any lazy caches (scaled boss frames) before tracing
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            entities = [create() for _ in range(count)]
+            sizes[name] = (tracemalloc.get_traced_memory()[0] - before) / count
+        finally:
+            tracemalloc.stop()
+        del entities
+    return sizes
+
+def run(names, frames, alloc_frames, dirty_rects=False):
+    view = game_module.GameView(dirty_rects)
+    results = {}
+    for name in names:
+        print(f"Running {name}...")
+        results[name] = time_scenario(name, frames, view)
+        if alloc_frames:
+            results[name]['alloc_bytes_per_frame'] = measure_allocations(name, alloc_frames, view)
+    return {
+        'entity_bytes': measure_entities(ENTITY_COUNT),
+        'meta': {
+            'python': platform.python_version(),
+            'pygame': pygame.version.ver,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'frames': frames,
+            'seed': SEED,
+            'dirty_rects': dirty_rects,
+        },
+        'scenarios': results,
+    }
+
+def print_results(report):
+    print(f"{'scenario':<18} {'update p50/p95/p99 (ms)':>26} {'draw p50/p95/p99 (ms)':>26} {'alloc p50 (KB)':>15}")
+    for name, result in report['scenarios'].items():
+        update = result['update_ms']
+        draw = result['draw_ms']
+        alloc = result.get('alloc_bytes_per_frame')
+        alloc_text = f"{alloc['p50'] / 1024:.1f}" if alloc else '-'
+        print(f"{name:<18} {update['p50']:8.3f} {update['p95']:8.3f} {update['p99']:8.3f} "
+              f"{draw['p50']:8.3f} {draw['p95']:8.3f} {draw['p99']:8.3f} {alloc_text:>15}")
+    print(f"{'entity':<18} {'bytes/object':>12}")
+    for name, size in report['entity_bytes'].items():
+        print(f"{name:<18} {size:12.0f}")
+
+def over_alloc_budget(report, budget):
+    # Scenarios whose p95 per-frame allocation exceeds budget bytes
+    over = []
+    for name, result in report['scenarios'].items():
+        alloc = result.get('alloc_bytes_per_frame')
+        if alloc and alloc['p95'] > budget:
+            print(f"{name:<18} allocates {alloc['p95']:.0f} bytes/frame at p95, budget {budget}  OVER BUDGET")
+            over.append(name)
+    return over
+
+def compare(report, baseline, threshold):
+    # A scenario regresses when its p95 update or draw time grows by more than threshold
+    regressions = []
+    for name, result in report['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name)
+        if not base:
+            continue
+        for metric in ('update_ms', 'draw_ms'):
+            old = base[metric]['p95']
+            new = result[metric]['p95']
+            change = (new - old) / old if old > 0 else 0.0
+            marker = ''
+            if change > threshold:
+                marker = '  REGRESSION'
+                regressions.append((name, metric))
+            print(f"{name:<18} {metric:<10} p95 {old:8.3f} -> {new:8.3f} ms ({change:+.1%}){marker}")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scenario benchmarks for Skibidi Shrek")
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help="scenario to run (repeatable; default: all)")
+    parser.add_argument('--frames', type=int, default=600, help="measured frames per scenario")
+    parser.add_argument('--alloc-frames', type=int, default=120,
+                        help="frames traced for allocations per scenario (0 to skip)")
+    parser.add_argument('--dirty-rects', action='store_true', help="draw with the dirty-rect renderer")
+    parser.add_argument('--output', default='benchmark_results.json', help="where to write the JSON results")
+    parser.add_argument('--baseline', help="earlier results file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help="allowed p95 slowdown against the baseline (0.15 = 15%%)")
+    parser.add_argument('--alloc-budget', type=int, default=ALLOC_BUDGET,
+                        help="fail when a traced scenario allocates more bytes per frame at p95 (0 to skip)")
+    args = parser.parse_args()
+
+    report = run(args.scenario or list(SCENARIOS), args.frames, args.alloc_frames, args.dirty_rects)
+    print_results(report)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    failed = False
+    if args.alloc_budget and over_alloc_budget(report, args.alloc_budget):
+        failed = True
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) past {args.threshold:.0%}")
+            failed = True
+    if failed:
+        sys.exit(1)
@@ -2,48 +2,67 @@ import pygame
 import random
 import math
 import asyncio
+import argparse
+import copy
+import cProfile
+import io
+import json
 import os
+import pickle
+import pstats
+import struct
 import sys
-from PIL import Image, ImageSequence  # Add PIL import for GIF handling
+import time
+import zlib
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from operator import attrgetter
+import numpy as np
+import hashlib
+# PIL is only needed to decode GIFs when the sprite cache is missing or stale
+try:
+    from PIL import Image, ImageSequence
+except ImportError:
+    Image = ImageSequence = None
+
+# Headless mode runs the simulation with SDL's dummy drivers and no drawing
+HEADLESS = '--headless' in sys.argv or os.environ.get('SKIBIDI_HEADLESS') == '1'
+if HEADLESS:
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
 
 # Initialize Pygame with browser-friendly settings
 pygame.init()
 pygame.mixer.init()  # Initialize the sound mixer
 
+# Constants
+WINDOW_WIDTH = 800
+WINDOW_HEIGHT = 600
+FPS = 60
+
 # Set up the display
-flags = pygame.SCALED
+flags = 0
+BROWSER = sys.platform == 'emscripten'  # No threads in the browser build
 if 'pyodide' in sys.modules:
     import platform
     if platform.system() == "Emscripten":
         flags = pygame.RESIZABLE
+        BROWSER = True
 
 screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT), flags)
 pygame.display.set_caption("Skibidi Shrek Swamp Showdown")
 
-# Constants
-WINDOW_WIDTH = 800
-WINDOW_HEIGHT = 600
-FPS = 60
-
 # Asset paths
 ASSET_DIR = os.path.join(os.path.dirname(__file__), 'assets')
 IMAGE_DIR = os.path.join(ASSET_DIR, 'images')
 SOUND_DIR = os.path.join(ASSET_DIR, 'sounds')
+SPRITE_CACHE_DIR = os.path.join(ASSET_DIR, 'cache')  # Decoded, scaled GIF frames
 
-# Load sound effects
-try:
-    PUNCH_SOUND = pygame.mixer.Sound(os.path.join(SOUND_DIR, 'punch.wav'))
-    KICK_SOUND = pygame.mixer.Sound(os.path.join(SOUND_DIR, 'kick.wav'))
-    FART_SOUND = pygame.mixer.Sound(os.path.join(SOUND_DIR, 'fart.wav'))
-    # Set volume for sounds
-    PUNCH_SOUND.set_volume(0.4)
-    KICK_SOUND.set_volume(0.4)
-    FART_SOUND.set_volume(0.3)
-except Exception as e:
-    print(f"Error loading sound effects: {e}")
-    PUNCH_SOUND = None
-    KICK_SOUND = None
-    FART_SOUND = None
+# Sound effects arrive from the asset loader (see ASSETS below)
+PUNCH_SOUND = None
+KICK_SOUND = None
+FART_SOUND = None
 
 # Colors
 WHITE = (255, 255, 255)
@@ -65,51 +84,250 @@ BOSS_INTRO = 3
 GAME_OVER = 4
 PAUSED = 5  # New pause state
 VICTORY = 6  # New victory state
+STATE_NAMES = {TITLE_SCREEN: 'title', PLAYING: 'playing', WAVE_ANNOUNCEMENT: 'wave_announcement',
+               BOSS_INTRO: 'boss_intro', GAME_OVER: 'game_over', PAUSED: 'paused', VICTORY: 'victory'}
 
-# Create the game window
-flags = 0
-if 'pyodide' in sys.modules:
-    flags = FULLSCREEN
-screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT), flags)
-pygame.display.set_caption("Skibidi Shrek Swamp Showdown")
+# Shared fonts, keyed by (font file, size)
+FONTS = {}
+
+def get_font(size, name=None):
+    key = (name, size)
+    font = FONTS.get(key)
+    if font is None:
+        try:
+            font = pygame.font.Font(name, size)
+        except Exception:
+            font = pygame.font.Font(None, size)  # Fallback if the font file isn't available
+        FONTS[key] = font
+    return font
+
+# Bounded LRU cache of rendered text surfaces
+class TextCache:
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, color, antialias=True):
+        key = (font, text, color, antialias)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+
+        self.misses += 1
+        surface = font.render(text, antialias, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)  # Evict least recently used
+        return surface
+
+    def clear(self):
+        self.surfaces.clear()
+        self.hits = 0
+        self.misses = 0
+
+TEXT_CACHE = TextCache()
+
+def render_text(font, text, color, antialias=True):
+    return TEXT_CACHE.render(font, text, color, antialias)
+
+# Offsets used to stamp text outlines and drop shadows
+TITLE_OUTLINE_OFFSETS = [
+    (-3,0), (3,0), (0,-3), (0,3),  # Cardinal directions
+    (-3,-3), (-3,3), (3,-3), (3,3),  # Diagonals
+    (-2,-2), (-2,2), (2,-2), (2,2),  # Inner diagonals
+    (-2,0), (2,0), (0,-2), (0,2)     # Inner cardinal
+]
+WAVE_OUTLINE_OFFSETS = [(-2,0), (2,0), (0,-2), (0,2), (-2,-2), (-2,2), (2,-2), (2,2)]
+DROP_SHADOW_OFFSETS = [(2,2)]
+
+# Outlined or shadowed text, composited once into a single surface
+class OutlinedText:
+    def __init__(self, font, text, offsets, color=WHITE, outline_color=BLACK):
+        self.font = font
+        self.offsets = offsets
+        self.color = color
+        self.outline_color = outline_color
+        self.text = None
+        self.set_text(text)
+
+    def set_text(self, text):
+        # Only re-composite when the text actually changes
+        if text == self.text:
+            return
+        self.text = text
+        text_surface = render_text(self.font, text, self.color)
+        outline_surface = render_text(self.font, text, self.outline_color)
+        self.width, self.height = text_surface.get_size()
+
+        min_dx = min([0] + [dx for dx, dy in self.offsets])
+        min_dy = min([0] + [dy for dx, dy in self.offsets])
+        max_dx = max([0] + [dx for dx, dy in self.offsets])
+        max_dy = max([0] + [dy for dx, dy in self.offsets])
+        self.surface = pygame.Surface((self.width + max_dx - min_dx, self.height + max_dy - min_dy), pygame.SRCALPHA)
+        for dx, dy in self.offsets:
+            self.surface.blit(outline_surface, (dx - min_dx, dy - min_dy))
+        self.surface.blit(text_surface, (-min_dx, -min_dy))
+        self.surface = self.surface.convert_alpha()
+        self.origin = (min_dx, min_dy)
+
+    def draw(self, screen, x, y):
+        # (x, y) is where the main text goes, matching a plain font.render blit
+        return screen.blit(self.surface, (x + self.origin[0], y + self.origin[1]))
+
+    def draw_centered(self, screen, center_x, y):
+        return self.draw(screen, center_x - self.width//2, y)
+
+# GIF frame durations are stored in 10 ms units
+ANIMATION_TIME_RESOLUTION = 10
+
+SPRITE_CACHE_MAGIC = b'SKSP'
+SPRITE_CACHE_VERSION = 1
+
+# Sprite cache file layout: magic, version, header length, JSON header
+# (source hash, scale, and each frame's size, duration and byte offset),
+# then every frame's raw RGBA pixels back to back
+def sprite_cache_path(gif_path, scale):
+    name = os.path.splitext(os.path.basename(gif_path))[0]
+    return os.path.join(SPRITE_CACHE_DIR, f"{name}@{scale:g}x.sprites")
+
+def file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def read_sprite_cache(cache_path, digest, scale):
+    # Returns (frames, durations, frame_delay), or None if the cache is missing, stale or damaged
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, 'rb') as f:
+            data = f.read()  # The whole cache in one read
+        if data[:4] != SPRITE_CACHE_MAGIC:
+            return None
+        version, header_length = struct.unpack_from('<HI', data, 4)
+        if version != SPRITE_CACHE_VERSION:
+            return None
+        header = json.loads(data[10:10 + header_length].decode('utf-8'))
+        if header['source'] != digest or header['scale'] != scale:
+            return None
+        pixels = memoryview(data)[10 + header_length:]
+        frames = []
+        durations = []
+        for width, height, duration, offset in header['frames']:
+            length = width * height * 4
+            frames.append(pygame.image.fromstring(pixels[offset:offset + length].tobytes(), (width, height), 'RGBA'))
+            durations.append(duration)
+        return frames, durations, header['frame_delay']
+    except (OSError, ValueError, KeyError, TypeError, struct.error) as e:
+        # A truncated or corrupt file is treated like a stale one: decode again and rewrite it
+        print(f"Error reading sprite cache {cache_path}: {e}")
+        return None
+
+def write_sprite_cache(cache_path, digest, scale, frames, durations, frame_delay):
+    header = {'source': digest, 'scale': scale, 'frame_delay': frame_delay, 'frames': []}
+    pixels = []
+    offset = 0
+    for frame, duration in zip(frames, durations):
+        frame_bytes = pygame.image.tostring(frame, 'RGBA')
+        header['frames'].append([frame.get_width(), frame.get_height(), duration, offset])
+        pixels.append(frame_bytes)
+        offset += len(frame_bytes)
+    header_data = json.dumps(header).encode('utf-8')
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    # Write to a temporary file first so a crash never leaves a half-written cache
+    temp_path = cache_path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(SPRITE_CACHE_MAGIC)
+        f.write(struct.pack('<HI', SPRITE_CACHE_VERSION, len(header_data)))
+        f.write(header_data)
+        for frame_bytes in pixels:
+            f.write(frame_bytes)
+    os.replace(temp_path, cache_path)
 
 # Create a class to handle GIF animations
 class AnimatedSprite:
     def __init__(self, gif_path, scale=1.0):
         self.frames = []
+        self.frame_durations = []
         self.current_frame = 0
         self.frame_delay = 0
         self.frame_timer = 0
         
         try:
-            gif = Image.open(gif_path)
-            self.frame_delay = gif.info.get('duration', 100)  # Default to 100ms if not specified
-            
-            for frame in ImageSequence.Iterator(gif):
-                # Convert PIL image to Pygame surface
-                frame_rgb = frame.convert('RGBA')
-                frame_bytes = frame_rgb.tobytes()
-                size = frame_rgb.size
-                pygame_frame = pygame.image.fromstring(frame_bytes, size, 'RGBA')
-                
-                # Scale if needed
-                if scale != 1.0:
-                    new_width = int(size[0] * scale)
-                    new_height = int(size[1] * scale)
-                    pygame_frame = pygame.transform.scale(pygame_frame, (new_width, new_height))
-                
-                self.frames.append(pygame_frame)
-            
-            print(f"Loaded {len(self.frames)} frames from {gif_path}")
+            digest = file_digest(gif_path)
+            cache_path = sprite_cache_path(gif_path, scale)
+            cached = read_sprite_cache(cache_path, digest, scale)
+            if cached:
+                self.frames, self.frame_durations, self.frame_delay = cached
+                print(f"Loaded {len(self.frames)} cached frames for {gif_path}")
+            else:
+                self.decode_gif(gif_path, scale)
+                print(f"Loaded {len(self.frames)} frames from {gif_path}")
+                try:
+                    write_sprite_cache(cache_path, digest, scale, self.frames, self.frame_durations, self.frame_delay)
+                except Exception as e:
+                    print(f"Could not write sprite cache {cache_path}: {e}")
         except Exception as e:
             print(f"Error loading GIF {gif_path}: {e}")
             self.frames = None
+            self.frame_durations = []
+        self.build_timeline()
+    
+    def decode_gif(self, gif_path, scale):
+        if Image is None:
+            raise RuntimeError("PIL is needed to decode GIFs that aren't in the sprite cache")
+        gif = Image.open(gif_path)
+        self.frame_delay = gif.info.get('duration', 100)  # Default to 100ms if not specified
+        
+        for frame in ImageSequence.Iterator(gif):
+            # Convert PIL image to Pygame surface
+            frame_rgb = frame.convert('RGBA')
+            frame_bytes = frame_rgb.tobytes()
+            size = frame_rgb.size
+            pygame_frame = pygame.image.fromstring(frame_bytes, size, 'RGBA')
+            
+            # Scale if needed
+            if scale != 1.0:
+                new_width = int(size[0] * scale)
+                new_height = int(size[1] * scale)
+                pygame_frame = pygame.transform.scale(pygame_frame, (new_width, new_height))
+            
+            self.frames.append(pygame_frame)
+            self.frame_durations.append(frame.info.get('duration') or self.frame_delay or 100)
+    
+    def build_timeline(self):
+        # Map every 10 ms slot of the loop to its frame so playback lookups are O(1)
+        self.frame_lookup = []
+        for index, duration in enumerate(self.frame_durations):
+            slots = max(1, -(-duration // ANIMATION_TIME_RESOLUTION))
+            self.frame_lookup.extend([index] * slots)
+        self.total_duration = len(self.frame_lookup) * ANIMATION_TIME_RESOLUTION
     
+    def scaled(self, width, height):
+        # Copy sharing this animation's timing, with every frame scaled to (width, height)
+        scaled = copy.copy(self)
+        if self.frames:
+            scaled.frames = [pygame.transform.scale(frame, (width, height)) for frame in self.frames]
+        return scaled
+
     def get_current_frame(self):
         if not self.frames:
             return None
         return self.frames[self.current_frame]
     
+    def frame_index_at(self, time_ms, phase=0):
+        # Stateless playback: any entity can share this animation with its own phase offset
+        slot = int((time_ms + phase) // ANIMATION_TIME_RESOLUTION)
+        return self.frame_lookup[slot % len(self.frame_lookup)]
+    
+    def frame_at(self, time_ms, phase=0):
+        if not self.frames:
+            return None
+        return self.frames[self.frame_index_at(time_ms, phase)]
+    
     def update(self, dt):
         if not self.frames:
             return None
@@ -121,8 +339,193 @@ class AnimatedSprite:
         
         return self.get_current_frame()
 
+# Separate seeded random streams per subsystem, so a replay reproduces the
+# same rolls and cosmetic randomness can't shift gameplay randomness
+class RandomStreams:
+    NAMES = ('spawn', 'loot', 'fx')
+
+    def __init__(self, seed=None):
+        self.seed(seed)
+
+    def seed(self, seed=None):
+        if seed is None:
+            seed = random.randrange(2**32)
+        self.base_seed = seed
+        for name in self.NAMES:
+            setattr(self, name, random.Random(f"{seed}:{name}"))
+
+    def getstate(self):
+        return {name: getattr(self, name).getstate() for name in self.NAMES}
+
+    def setstate(self, state):
+        for name in self.NAMES:
+            getattr(self, name).setstate(state[name])
+
+RNG = RandomStreams()
+
+# Global clock that drives all animation playback
+class AnimationClock:
+    def __init__(self):
+        self.time_ms = 0
+
+    def advance(self, dt):
+        self.time_ms += dt
+
+ANIMATION_CLOCK = AnimationClock()
+
+# Longest frame the simulation will try to catch up on (ms); anything more is dropped
+MAX_FRAME_TIME = 250
+
+# Frame phases timed for the performance overlay
+PERF_PHASES = ('events', 'shrek', 'spawning', 'enemies', 'boss', 'fart_clouds', 'draw', 'flip')
+PERF_HISTORY = 120  # Frames kept for the frame-time graph
+
+# Per-phase frame timings; costs one flag check per phase while disabled
+class PerfStats:
+    def __init__(self):
+        self.enabled = False
+        self.frame_phases = dict.fromkeys(PERF_PHASES, 0.0)  # This frame so far (ms)
+        self.phase_ms = dict.fromkeys(PERF_PHASES, 0.0)  # Smoothed over recent frames
+        self.frame_times = deque(maxlen=PERF_HISTORY)
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.frame_times.clear()
+        for phase in PERF_PHASES:
+            self.frame_phases[phase] = 0.0
+            self.phase_ms[phase] = 0.0
+
+    def run(self, phase, func, *args):
+        if not self.enabled:
+            return func(*args)
+        start = time.perf_counter()
+        result = func(*args)
+        self.frame_phases[phase] += (time.perf_counter() - start) * 1000
+        return result
+
+    def end_frame(self, frame_ms):
+        self.frame_times.append(frame_ms)
+        for phase, ms in self.frame_phases.items():
+            self.phase_ms[phase] = self.phase_ms[phase] * 0.9 + ms * 0.1
+            self.frame_phases[phase] = 0.0
+
+    def fps(self):
+        if not self.frame_times:
+            return 0.0
+        average = sum(self.frame_times) / len(self.frame_times)
+        return 1000 / average if average > 0 else 0.0
+
+PERF = PerfStats()
+
+PROFILE_DIR = 'profiles'
+PROFILE_FRAMES = 300  # Frames captured by the F4 hotkey
+
+def collapse_stacks(stats):
+    # Turn cProfile's caller/callee edges into flamegraph "a;b;c microseconds" lines.
+    # cProfile has no full stacks, so a callee's time is split between its
+    # callers in proportion to the time each call edge accounts for.
+    def label(func):
+        filename, line, name = func
+        return f"{name} ({os.path.basename(filename)}:{line})" if line else name
+
+    children = {}
+    for func, (cc, nc, tt, ct, callers) in stats.items():
+        for caller, edge in callers.items():
+            children.setdefault(caller, []).append((func, edge[3]))
+
+    totals = {}
+    def walk(func, path, fraction):
+        if len(path) > 64:
+            return
+        path = path + (label(func),)
+        tt, ct = stats[func][2], stats[func][3]
+        totals[path] = totals.get(path, 0.0) + tt * fraction
+        for child, edge_time in children.get(func, ()):
+            if child in stats and label(child) not in path and stats[child][3] > 0:
+                walk(child, path, fraction * edge_time / stats[child][3])
+
+    for func, (cc, nc, tt, ct, callers) in stats.items():
+        if not any(caller in stats for caller in callers):
+            walk(func, (), 1.0)
+    return [f"{';'.join(path)} {int(seconds * 1e6)}"
+            for path, seconds in sorted(totals.items()) if seconds * 1e6 >= 1]
+
+# Profiles the next N frames with cProfile and writes pstats, collapsed stacks and tags
+class ProfileCapture:
+    def __init__(self):
+        self.profiler = None
+        self.frames_left = 0
+        self.tags = None
+
+    @property
+    def active(self):
+        return self.profiler is not None
+
+    def start(self, frames, game):
+        if self.active:
+            return
+        self.tags = {
+            'state': STATE_NAMES.get(game.game_state, str(game.game_state)),
+            'wave': game.current_wave,
+            'tick': game.tick_count,
+            'frames': frames,
+            'enemies': len(game.enemies),
+            'boss': type(game.boss).__name__ if game.boss else None,
+            'projectiles': PROJECTILE_POOL.count,
+            'fart_clouds': len(game.fart_clouds),
+            'onions': len(game.onions),
+        }
+        print(f"Profiling {frames} frames...")
+        self.frames_left = frames
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+
+    def end_frame(self):
+        if self.active:
+            self.frames_left -= 1
+            if self.frames_left <= 0:
+                self.finish()
+
+    def finish(self):
+        self.profiler.disable()
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            base = os.path.join(PROFILE_DIR, time.strftime('profile-%Y%m%d-%H%M%S') +
+                                f"-{self.tags['state']}-wave{self.tags['wave']}")
+            self.profiler.dump_stats(base + '.prof')
+            stats = pstats.Stats(self.profiler).stats
+            with open(base + '.folded', 'w') as f:
+                f.write('\n'.join(collapse_stacks(stats)) + '\n')
+            with open(base + '.json', 'w') as f:
+                json.dump(self.tags, f, indent=2)
+            print(f"Wrote profile to {base}.prof / .folded / .json")
+        except Exception as e:
+            print(f"Error writing profile: {e}")
+        self.profiler = None
+
+PROFILER = ProfileCapture()
+
+# Runs the simulation at a fixed rate no matter how fast frames are drawn.
+# All speeds, cooldowns and timers in the game are per simulation tick.
+class FixedTimestep:
+    def __init__(self, rate=FPS):
+        self.step_ms = 1000 / rate
+        self.accumulator = 0.0
+
+    def advance(self, frame_ms):
+        # Bank the frame's real time and return how many ticks are due
+        self.accumulator += min(frame_ms, MAX_FRAME_TIME)
+        ticks = int(self.accumulator // self.step_ms)
+        self.accumulator -= ticks * self.step_ms
+        return ticks
+
+    @property
+    def alpha(self):
+        # How far the render falls between the last two ticks, 0..1
+        return self.accumulator / self.step_ms
+
 # Load images
-def load_image(filename, scale=1.0):
+def load_image(filename, scale=1.0, convert=True):
     try:
         path = os.path.join(IMAGE_DIR, filename)
         print(f"Attempting to load image from: {path}")
@@ -131,12 +534,9 @@ def load_image(filename, scale=1.0):
             return None
             
         image = pygame.image.load(path)
-        # Convert the image with alpha for proper transparency
-        if filename.endswith('.gif'):
-            # For GIF files, we need to handle them differently
-            image = image.convert_alpha()
-        else:
-            # For PNG files, regular convert_alpha is fine
+        # Convert the image with alpha for proper transparency. Worker threads
+        # skip this and leave it to the main thread, which owns the display.
+        if convert:
             image = image.convert_alpha()
             
         if scale != 1.0:
@@ -148,73 +548,147 @@ def load_image(filename, scale=1.0):
         print(f"Error loading image {filename}: {e}")
         return None
 
-# Create the game window
-flags = 0
-if 'pyodide' in sys.modules:
-    flags = FULLSCREEN
-screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT), flags)
-pygame.display.set_caption("Skibidi Shrek Swamp Showdown")
+# Procedural jungle background. Everything is green, so it is drawn as a
+# single green channel in NumPy, one layer of shapes at a time: each shape
+# becomes a run of row spans and the spans are filled in drawing order.
+JUNGLE_VERSION = 1  # Bump when the generator changes so old cache files are ignored
+JUNGLE_BASE_SIZE = (800, 600)  # Shape counts are per this much area, so big backgrounds keep the same density
+JUNGLE_SEED = 0
+
+def circle_spans(cx, cy, radius):
+    # Row spans (row, first x, last x, circle index) covering each filled circle
+    counts = 2 * radius + 1
+    index = np.repeat(np.arange(len(cx)), counts)
+    dy = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) - radius[index]
+    half = np.sqrt(radius[index] ** 2 - dy ** 2).astype(np.int64)
+    return cy[index] + dy, cx[index] - half, cx[index] + half, index
+
+def rect_spans(x, y, width, height):
+    index = np.repeat(np.arange(len(x)), height)
+    dy = np.arange(height.sum()) - np.repeat(np.cumsum(height) - height, height)
+    return y[index] + dy, x[index], x[index] + width[index] - 1, index
+
+def paint_spans(image, rows, first, last, values):
+    # Later spans cover earlier ones, like drawing the shapes one by one
+    height, width = image.shape
+    first = np.maximum(first, 0)
+    last = np.minimum(last, width - 1)
+    keep = (rows >= 0) & (rows < height) & (first <= last)
+    rows, first, values = rows[keep], first[keep], values[keep].astype(image.dtype)
+    # 32-bit offsets: these arrays hold one entry per painted pixel
+    lengths = (last[keep] - first + 1).astype(np.int32)
+    starts = (rows * width + first - (np.cumsum(lengths) - lengths)).astype(np.int32)
+    image.ravel()[np.repeat(starts, lengths) + np.arange(lengths.sum(), dtype=np.int32)] = np.repeat(values, lengths)
+
+def span_mask(shape, rows, first, last):
+    # Union of spans as a boolean image
+    height, width = shape
+    first = np.clip(first, 0, width)
+    last = np.clip(last + 1, 0, width)
+    keep = (rows >= 0) & (rows < height)
+    # +1 where a span starts and -1 past its end; a running sum along each row counts covering spans
+    edges = np.zeros((height, width + 1), dtype=np.int16)
+    np.add.at(edges, (rows[keep], first[keep]), 1)
+    np.add.at(edges, (rows[keep], last[keep]), -1)
+    return np.cumsum(edges, axis=1, dtype=np.int16)[:, :width] > 0
+
+def generate_jungle_background(seed, size):
+    # Returns the green channel as a (height, width) uint8 array
+    width, height = size
+    rng = np.random.default_rng(seed)
+    density = width * height / (JUNGLE_BASE_SIZE[0] * JUNGLE_BASE_SIZE[1])
+    def count(n):
+        return max(1, round(n * density))
 
-# Create a simple jungle background
-def create_jungle_background():
-    surf = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT))
-    
     # Create a darker gradient background with deeper greens
-    for y in range(WINDOW_HEIGHT):
-        # Create a darker, more jungle-like gradient
-        shade = int(10 + (y / WINDOW_HEIGHT) * 25)  # Reduced brightness
-        color = (0, min(40 + shade, 80), 0)  # Much darker green
-        pygame.draw.line(surf, color, (0, y), (WINDOW_WIDTH, y))
-    
-    # Add large background trees (darker shapes)
-    for _ in range(15):
-        x = random.randint(0, WINDOW_WIDTH)
-        height = random.randint(100, 300)
-        width = random.randint(40, 80)
-        y = random.randint(0, WINDOW_HEIGHT - height)
-        tree_color = (0, random.randint(20, 35), 0)  # Darker trees
-        pygame.draw.rect(surf, tree_color, (x, y, width, height))
-        # Add tree canopy
-        canopy_color = (0, random.randint(25, 45), 0)  # Darker canopy
-        pygame.draw.circle(surf, canopy_color, (x + width//2, y), width//1.5)
-    
+    shade = (10 + np.arange(height) / height * 25).astype(np.int64)
+    green = np.empty((height, width), dtype=np.uint8)
+    green[:] = np.minimum(40 + shade, 80)[:, None]
+
+    # Add large background trees (darker shapes), each a trunk then its canopy
+    trees = count(15)
+    tree_x = rng.integers(0, width, trees, endpoint=True)
+    tree_height = rng.integers(100, 300, trees, endpoint=True)
+    tree_width = rng.integers(40, 80, trees, endpoint=True)
+    tree_y = (rng.random(trees) * (height - tree_height + 1)).astype(np.int64)
+    trunk = rect_spans(tree_x, tree_y, tree_width, tree_height)
+    canopy = circle_spans(tree_x + tree_width // 2, tree_y, (tree_width / 1.5).astype(np.int64))
+    trunk_shade = rng.integers(20, 35, trees, endpoint=True)
+    canopy_shade = rng.integers(25, 45, trees, endpoint=True)
+    rows, first, last, order = (np.concatenate(pair) for pair in zip(trunk, canopy))
+    values = np.concatenate((trunk_shade[trunk[3]], canopy_shade[canopy[3]]))
+    layer = np.argsort(np.concatenate((trunk[3] * 2, canopy[3] * 2 + 1)), kind='stable')
+    paint_spans(green, rows[layer], first[layer], last[layer], values[layer])
+
     # Add dense vegetation layers (mid-ground)
-    for _ in range(200):
-        x = random.randint(0, WINDOW_WIDTH)
-        y = random.randint(0, WINDOW_HEIGHT)
-        size = random.randint(10, 30)
-        shade = random.randint(30, 70)  # Darker vegetation
-        pygame.draw.circle(surf, (0, shade, 0), (x, y), size)
-    
-    # Add vines with more natural curves
-    for _ in range(25):
-        start_x = random.randint(0, WINDOW_WIDTH)
-        points = [(start_x, 0)]
-        current_x = start_x
-        
-        for y in range(50, WINDOW_HEIGHT, 20):
-            current_x += random.randint(-15, 15)
-            points.append((current_x, y))
-        
-        vine_color = (0, random.randint(35, 55), 0)  # Darker vines
-        pygame.draw.lines(surf, vine_color, False, points, random.randint(2, 4))
-        
-        # Add small leaves along the vine
-        for point in points[::2]:
-            leaf_size = random.randint(4, 8)
-            leaf_color = (0, random.randint(40, 80), 0)  # Darker leaves
-            pygame.draw.circle(surf, leaf_color, (point[0], point[1]), leaf_size)
-    
-    # Add some atmospheric shadows
-    shadow_surface = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT), pygame.SRCALPHA)
-    for _ in range(30):
-        x = random.randint(0, WINDOW_WIDTH)
-        y = random.randint(0, WINDOW_HEIGHT)
-        size = random.randint(50, 150)
-        pygame.draw.circle(shadow_surface, (0, 0, 0, 10), (x, y), size)
-    surf.blit(shadow_surface, (0, 0))
-    
-    return surf
+    plants = count(200)
+    rows, first, last, index = circle_spans(rng.integers(0, width, plants, endpoint=True),
+                                            rng.integers(0, height, plants, endpoint=True),
+                                            rng.integers(10, 30, plants, endpoint=True))
+    paint_spans(green, rows, first, last, rng.integers(30, 70, plants, endpoint=True)[index])
+
+    # Add vines: a random walk down the screen, with leaves on every other point
+    vines = max(1, round(25 * width / JUNGLE_BASE_SIZE[0]))  # Vines run the full height
+    point_y = np.concatenate(([0], np.arange(50, height, 20)))
+    point_x = rng.integers(0, width, vines, endpoint=True)[:, None] + np.concatenate(
+        (np.zeros((vines, 1), dtype=np.int64),
+         np.cumsum(rng.integers(-15, 15, (vines, len(point_y) - 1), endpoint=True), axis=1)), axis=1)
+    vine_shade = rng.integers(35, 55, vines, endpoint=True)
+    vine_width = rng.integers(2, 4, vines, endpoint=True)
+    vine_rows = np.arange(point_y[-1] + 1)
+    centers = np.stack([np.interp(vine_rows, point_y, xs) for xs in point_x]).round().astype(np.int64)
+    vine_index = np.repeat(np.arange(vines), len(vine_rows))
+    left = centers.ravel() - vine_width[vine_index] // 2
+    vine = (np.tile(vine_rows, vines), left, left + vine_width[vine_index] - 1, vine_index)
+    leaf_x = point_x[:, ::2].ravel()
+    leaf_y = np.tile(point_y[::2], vines)
+    leaf_owner = np.repeat(np.arange(vines), len(point_y[::2]))
+    leaf_rows, leaf_first, leaf_last, leaf_index = circle_spans(
+        leaf_x, leaf_y, rng.integers(4, 8, len(leaf_x), endpoint=True))
+    leaf_shade = rng.integers(40, 80, len(leaf_x), endpoint=True)
+    rows = np.concatenate((vine[0], leaf_rows))
+    first = np.concatenate((vine[1], leaf_first))
+    last = np.concatenate((vine[2], leaf_last))
+    values = np.concatenate((vine_shade[vine_index], leaf_shade[leaf_index]))
+    layer = np.argsort(np.concatenate((vine_index * 2, leaf_owner[leaf_index] * 2 + 1)), kind='stable')
+    paint_spans(green, rows[layer], first[layer], last[layer], values[layer])
+
+    # Add some atmospheric shadows: a faint black wash wherever any shadow falls
+    shadows = count(30)
+    rows, first, last, _ = circle_spans(rng.integers(0, width, shadows, endpoint=True),
+                                        rng.integers(0, height, shadows, endpoint=True),
+                                        rng.integers(50, 150, shadows, endpoint=True))
+    shaded = span_mask(green.shape, rows, first, last)
+    np.subtract(green, green // 25, out=green, where=shaded)  # About 10/255 darker
+    return green
+
+def jungle_cache_path(seed, size):
+    return os.path.join(SPRITE_CACHE_DIR, f"jungle-v{JUNGLE_VERSION}-{seed}-{size[0]}x{size[1]}.npy")
+
+def create_jungle_background(seed=JUNGLE_SEED, size=(WINDOW_WIDTH, WINDOW_HEIGHT)):
+    # Memoized on disk by (seed, size); size may be larger than the window
+    cache_path = jungle_cache_path(seed, size)
+    green = None
+    try:
+        if os.path.exists(cache_path):
+            green = np.load(cache_path)
+            if green.shape != (size[1], size[0]):
+                green = None
+    except Exception as e:
+        print(f"Error reading jungle background cache {cache_path}: {e}")
+    if green is None:
+        green = generate_jungle_background(seed, size)
+        try:
+            os.makedirs(SPRITE_CACHE_DIR, exist_ok=True)
+            temp_path = cache_path + '.tmp'
+            with open(temp_path, 'wb') as f:
+                np.save(f, green)
+            os.replace(temp_path, cache_path)
+        except Exception as e:
+            print(f"Could not write jungle background cache {cache_path}: {e}")
+    pixels = np.zeros((size[0], size[1], 3), dtype=np.uint8)
+    pixels[:, :, 1] = green.T  # surfarray indexes pixels as [x, y]
+    return pygame.surfarray.make_surface(pixels)
 
 # Create default sprites
 def create_shrek_sprite():
@@ -246,60 +720,340 @@ def create_toilet_sprite():
     pygame.draw.circle(surf, BLACK, (35, 25), 5)
     return surf
 
-# Load and scale sprites
-try:
-    print("Loading sprites...")
-    SHREK_ANIMATION = AnimatedSprite(os.path.join(IMAGE_DIR, 'Bigblackshrek.gif'), 2.5)
-    SHREK_RIGHT = SHREK_ANIMATION.get_current_frame() if SHREK_ANIMATION.frames else create_shrek_sprite()
-    
-    TOILET_ANIMATION = AnimatedSprite(os.path.join(IMAGE_DIR, 'Skibidi toilets.gif'), 2.0)
-    TOILET_SPRITE = TOILET_ANIMATION.get_current_frame() if TOILET_ANIMATION.frames else create_toilet_sprite()
-    
-    ONION_SPRITE = load_image('pixel_onion.png', 0.2)
-    if ONION_SPRITE:
-        print("Onion sprite loaded successfully")
-    
-    BACKGROUND_IMAGE = load_image('Grass Background.png')
-    if BACKGROUND_IMAGE:
-        print("Background loaded successfully")
-    
-    SWAMP_BACKGROUND = load_image('Swamp.jpg')
-    if SWAMP_BACKGROUND:
-        print("Swamp background loaded successfully")
-        SWAMP_BACKGROUND = pygame.transform.scale(SWAMP_BACKGROUND, (WINDOW_WIDTH, WINDOW_HEIGHT))
-    
-    # Create fallback sprites if loading fails
+# Loads assets on a thread pool while the title screen is up. Each asset has
+# a load function, run on a worker, that only decodes and scales, and an
+# install function, run on the main thread in poll(), that converts surfaces
+# for the display and publishes them as module globals. Required assets must
+# be in before a game is created; the rest may land at any time.
+class AssetLoader:
+    def __init__(self, threaded=True, workers=4):
+        self.threaded = threaded
+        self.workers = workers
+        self.assets = []  # (name, load, install, required)
+        self.loaded = set()
+        self.pending = deque()
+        self.futures = {}
+        self.executor = None
+        self.started = False
+
+    def add(self, name, load, install, required=True):
+        self.assets.append((name, load, install, required))
+
+    @property
+    def progress(self):
+        return len(self.loaded) / len(self.assets) if self.assets else 1.0
+
+    @property
+    def ready(self):
+        # Everything gameplay needs is installed
+        return all(name in self.loaded for name, _, _, required in self.assets if required)
+
+    @property
+    def finished(self):
+        return len(self.loaded) == len(self.assets)
+
+    def start(self):
+        if self.started:
+            return
+        self.started = True
+        # Required assets go first so the game can start as early as possible
+        queue = sorted(self.assets, key=lambda asset: not asset[3])
+        if self.threaded:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='assets')
+            for asset in queue:
+                self.futures[self.executor.submit(asset[1])] = asset
+        else:
+            self.pending.extend(queue)
+
+    def poll(self):
+        # Install whatever has finished loading; returns True if anything changed
+        self.start()
+        installed = False
+        if self.executor:
+            for future in [future for future in self.futures if future.done()]:
+                asset = self.futures.pop(future)
+                try:
+                    self.install(asset, future.result())
+                except Exception as e:
+                    self.fail(asset, e)
+                installed = True
+            if not self.futures:
+                self.executor.shutdown(wait=False)
+                self.executor = None
+        elif self.pending:
+            # No threads: load one asset per call so the title screen keeps drawing
+            asset = self.pending.popleft()
+            try:
+                self.install(asset, asset[1]())
+            except Exception as e:
+                self.fail(asset, e)
+            installed = True
+        return installed
+
+    def install(self, asset, value):
+        name, _, install, _ = asset
+        install(value)
+        self.loaded.add(name)
+
+    def fail(self, asset, error):
+        # The asset keeps its placeholder
+        print(f"Error loading {asset[0]}: {error}")
+        self.loaded.add(asset[0])
+
+    def load_all(self):
+        # Block until everything is installed (headless runs and tools)
+        self.start()
+        while not self.finished:
+            if self.futures:
+                wait(list(self.futures), return_when=FIRST_COMPLETED)
+            self.poll()
+
+def load_shrek():
+    return AnimatedSprite(os.path.join(IMAGE_DIR, 'Bigblackshrek.gif'), 2.5)
+
+def install_shrek(animation):
+    global SHREK_ANIMATION, SHREK_RIGHT, SHREK_LEFT
+    SHREK_ANIMATION = animation
+    SHREK_RIGHT = animation.get_current_frame() if animation.frames else None
     if not SHREK_RIGHT:
         print("Failed to load Shrek sprite, using fallback")
         SHREK_RIGHT = create_shrek_sprite()
+    # Create left-facing Shrek sprite
+    SHREK_LEFT = pygame.transform.flip(SHREK_RIGHT, True, False)
+
+def load_toilet():
+    return AnimatedSprite(os.path.join(IMAGE_DIR, 'Skibidi toilets.gif'), 2.0)
+
+def install_toilet(animation):
+    global TOILET_ANIMATION, TOILET_SPRITE
+    TOILET_ANIMATION = animation
+    TOILET_SPRITE = animation.get_current_frame() if animation.frames else None
     if not TOILET_SPRITE:
         print("Failed to load toilet sprite, using fallback")
         TOILET_SPRITE = create_toilet_sprite()
-    if not BACKGROUND_IMAGE:
-        print("Failed to load background, using fallback")
-        BACKGROUND_IMAGE = create_jungle_background()
-    if not SWAMP_BACKGROUND:
-        print("Failed to load swamp background, using fallback")
-        SWAMP_BACKGROUND = create_jungle_background()
-    
-    # Create left-facing Shrek sprite
-    SHREK_LEFT = pygame.transform.flip(SHREK_RIGHT, True, False)
-    
-    # Scale background to window size if loaded successfully
-    if BACKGROUND_IMAGE:
-        BACKGROUND_IMAGE = pygame.transform.scale(BACKGROUND_IMAGE, (WINDOW_WIDTH, WINDOW_HEIGHT))
 
-except Exception as e:
-    print(f"Error loading sprites: {e}")
-    SHREK_RIGHT = create_shrek_sprite()
-    SHREK_LEFT = pygame.transform.flip(SHREK_RIGHT, True, False)
-    TOILET_SPRITE = create_toilet_sprite()
-    BACKGROUND_IMAGE = create_jungle_background()
+def load_onion():
+    return load_image('pixel_onion.png', 0.2, convert=False)
+
+def install_onion(image):
+    global ONION_SPRITE
+    ONION_SPRITE = image.convert_alpha() if image else None
+    if ONION_SPRITE:
+        print("Onion sprite loaded successfully")
+
+def load_background(filename, seed):
+    # Returns (surface, loaded from file); a generated jungle stands in for a missing file
+    image = load_image(filename, convert=False)
+    if not image:
+        print(f"Failed to load {filename}, using fallback")
+        return create_jungle_background(seed), False
+    return pygame.transform.scale(image, (WINDOW_WIDTH, WINDOW_HEIGHT)), True
+
+def install_grass(result):
+    global BACKGROUND_IMAGE, BACKGROUND
+    image, from_file = result
+    BACKGROUND_IMAGE = BACKGROUND = image.convert_alpha() if from_file else image
+    print("Background loaded")
+
+def install_swamp(result):
+    global SWAMP_BACKGROUND
+    image, from_file = result
+    SWAMP_BACKGROUND = image.convert_alpha() if from_file else image
+    print("Swamp background loaded")
+
+def load_sounds():
+    try:
+        sounds = []
+        for filename, volume in (('punch.wav', 0.4), ('kick.wav', 0.4), ('fart.wav', 0.3)):
+            sound = pygame.mixer.Sound(os.path.join(SOUND_DIR, filename))
+            sound.set_volume(volume)
+            sounds.append(sound)
+        return sounds
+    except Exception as e:
+        print(f"Error loading sound effects: {e}")
+        return [None, None, None]
+
+def install_sounds(sounds):
+    global PUNCH_SOUND, KICK_SOUND, FART_SOUND
+    PUNCH_SOUND, KICK_SOUND, FART_SOUND = sounds
+
+# Placeholders until the loader installs the real assets
+SHREK_ANIMATION = None
+SHREK_RIGHT = create_shrek_sprite()
+SHREK_LEFT = pygame.transform.flip(SHREK_RIGHT, True, False)
+TOILET_ANIMATION = None
+TOILET_SPRITE = create_toilet_sprite()
+ONION_SPRITE = None
+BACKGROUND_IMAGE = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT))
+BACKGROUND_IMAGE.fill((0, 40, 0))
+SWAMP_BACKGROUND = None  # The victory scene uses the jungle until it arrives
 
 # Set the background
 BACKGROUND = BACKGROUND_IMAGE
 
+ASSETS = AssetLoader(threaded=not BROWSER)
+ASSETS.add('shrek', load_shrek, install_shrek)
+ASSETS.add('toilet', load_toilet, install_toilet)
+ASSETS.add('onion', load_onion, install_onion)
+ASSETS.add('background', lambda: load_background('Grass Background.png', JUNGLE_SEED), install_grass, required=False)
+ASSETS.add('swamp', lambda: load_background('Swamp.jpg', JUNGLE_SEED + 1), install_swamp, required=False)
+ASSETS.add('sounds', load_sounds, install_sounds, required=False)
+if HEADLESS:
+    # Nothing to show while loading, and tools importing the module want every asset in place
+    ASSETS.load_all()
+
+# A full-screen tint allocated once. Fading it only changes the surface's
+# alpha, so drawing never allocates.
+class ScreenOverlay:
+    def __init__(self, color):
+        self.surface = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT))
+        self.surface.fill(color)
+        self.alpha = None
+
+    def draw(self, screen, alpha):
+        if alpha != self.alpha:
+            self.alpha = alpha
+            self.surface.set_alpha(alpha)
+        return screen.blit(self.surface, (0, 0))
+
+POOP_STAIN_DURATION = 120  # 2 seconds at 60 FPS
+HEAL_POPUP_DURATION = 30  # Half a second, so every render rate gets to show it
+POOP_STAIN_OVERLAY = ScreenOverlay(DARK_BROWN)
+
+# Module-level animations at the sizes entities draw them, keyed by
+# (global name, width, height) and shared by every instance. Each entry keeps
+# the animation it was scaled from, so a newly loaded asset replaces it.
+SCALED_ANIMATIONS = {}
+
+def get_scaled_animation(name, width, height):
+    key = (name, width, height)
+    source = globals()[name]
+    entry = SCALED_ANIMATIONS.get(key)
+    if entry is None or entry[0] is not source:
+        entry = SCALED_ANIMATIONS[key] = (source, source.scaled(width, height))
+    return entry[1]
+
+# Tinted copies of sprite frames, keyed by (frame, tint color, flash state)
+TINTED_SPRITE_CACHE = {}
+
+def get_tinted_sprite(sprite, color, flash=False):
+    key = (sprite, color, flash)
+    tinted = TINTED_SPRITE_CACHE.get(key)
+    if tinted is None:
+        tinted = sprite.copy()
+        # Apply color tint more strongly
+        tinted.fill((*color, 255), special_flags=pygame.BLEND_RGBA_MULT)
+        if flash:
+            # White flash effect when hit
+            tinted.fill((255, 255, 255, 128), special_flags=pygame.BLEND_RGBA_MULT)
+        tinted = tinted.convert_alpha()
+        TINTED_SPRITE_CACHE[key] = tinted
+    return tinted
+
+# Pre-rendered onion pulse frames, keyed by (sprite, rarity). Each entry is a list
+# of (surface, x offset, y offset) for every pulse phase.
+ONION_PULSE_PHASES = 60
+ONION_RARITY_TINTS = {'white': None, 'blue': LIGHT_BLUE, 'gold': GOLD}
+ONION_PULSE_CACHE = {}
+
+def get_onion_frames(sprite, rarity, color, width, height):
+    key = (sprite, rarity)
+    frames = ONION_PULSE_CACHE.get(key)
+    if frames is None:
+        frames = []
+        if sprite:
+            # Create colored version of the sprite based on rarity
+            colored_sprite = sprite.copy()
+            tint = ONION_RARITY_TINTS[rarity]
+            if tint:
+                colored_sprite.fill((*tint, 128), special_flags=pygame.BLEND_RGBA_MULT)
+        for phase in range(ONION_PULSE_PHASES):
+            pulse = abs(math.sin(phase * 0.1)) * 0.3 + 0.7
+            size = int(width * pulse)
+            if sprite:
+                # Scale sprite with pulse
+                frame = pygame.transform.scale(colored_sprite, (size * 2, size * 2)).convert_alpha()
+                frames.append((frame, width//2 - size, height//2 - size))
+            else:
+                # Fallback onion: layered circles with a small stem
+                center = size + 2
+                frame = pygame.Surface((center * 2 + 1, center * 2 + 1), pygame.SRCALPHA)
+                pygame.draw.circle(frame, color, (center, center), size)
+                pygame.draw.circle(frame, color, (center, center), size + 2)
+                pygame.draw.rect(frame, (0, 100, 0), (center - 2, center - size, 4, 6))
+                frames.append((frame, width//2 - center, height//2 - center))
+        ONION_PULSE_CACHE[key] = frames
+    return frames
+
+# Size of a spatial hash cell, roughly one toilet plus attack reach
+SPATIAL_CELL_SIZE = 96
+
+# Uniform grid for broad-phase collision queries, split into named layers
+class SpatialHash:
+    def __init__(self, cell_size=SPATIAL_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.entries = {}  # id(obj) -> (obj, layer, cell range, insertion order)
+        self.next_order = 0
+
+    def clear(self):
+        self.cells.clear()
+        self.entries.clear()
+        self.next_order = 0
+
+    def cell_range(self, x, y, width, height):
+        size = self.cell_size
+        return (int(x // size), int(y // size), int((x + width) // size), int((y + height) // size))
+
+    def insert(self, obj, layer, x, y, width, height):
+        x0, y0, x1, y1 = cell_range = self.cell_range(x, y, width, height)
+        self.entries[id(obj)] = (obj, layer, cell_range, self.next_order)
+        self.next_order += 1
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = self.cells.get((layer, cx, cy))
+                if bucket is None:
+                    self.cells[(layer, cx, cy)] = [obj]
+                else:
+                    bucket.append(obj)
+
+    def remove(self, obj):
+        entry = self.entries.pop(id(obj), None)
+        if entry is None:
+            return
+        _, layer, (x0, y0, x1, y1), _ = entry
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = self.cells[(layer, cx, cy)]
+                bucket.remove(obj)
+                if not bucket:
+                    del self.cells[(layer, cx, cy)]
+
+    def query_rect(self, layer, x, y, width, height):
+        # Returns every object in the layer whose cells overlap the rect, in insertion order
+        x0, y0, x1, y1 = self.cell_range(x, y, width, height)
+        found = {}
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = self.cells.get((layer, cx, cy))
+                if bucket:
+                    for obj in bucket:
+                        found[id(obj)] = obj
+        if len(found) > 1:
+            entries = self.entries
+            return sorted(found.values(), key=lambda obj: entries[id(obj)][3])
+        return list(found.values())
+
+def bounding_rect(*rects):
+    # Smallest Rect covering every non-empty rect given (None entries are skipped)
+    rects = [rect for rect in rects if rect and rect.width and rect.height]
+    if not rects:
+        return None
+    return rects[0].unionall(rects[1:])
+
 class AttackAnimation:
+    __slots__ = ('x', 'y', 'attack_type', 'facing_right', 'frame', 'max_frames', 'width', 'height')
+
     def __init__(self, x, y, attack_type, facing_right):
         self.x = x
         self.y = y
@@ -315,8 +1069,18 @@ class AttackAnimation:
         return self.frame < self.max_frames
 
     def draw(self, screen):
+        key = ('attack', self.attack_type, self.facing_right, self.frame)
+        entry = EFFECT_ATLAS.get(key)
+        if entry is None:
+            entry = EFFECT_ATLAS[key] = self.render()
+        surface, x_offset, y_offset = entry
+        return screen.blit(surface, (self.x + x_offset, self.y + y_offset))
+
+    def render(self):
+        # Returns (surface, x offset, y offset) for the current frame
         progress = self.frame / self.max_frames
         alpha = int(255 * (1 - progress))
+        facing_right = self.facing_right
         
         if self.attack_type == 'punch':
             # Draw fist with darker green
@@ -327,9 +1091,9 @@ class AttackAnimation:
             pygame.draw.circle(fist_surface, (20, 100, 20, alpha), (20, 10), 10)
             
             extend = int(80 * (1 - progress))
-            x_offset = extend if self.facing_right else -extend
-            screen.blit(fist_surface if self.facing_right else pygame.transform.flip(fist_surface, True, False),
-                       (self.x + x_offset, self.y + 30))
+            x_offset = extend if facing_right else -extend
+            return (fist_surface if facing_right else pygame.transform.flip(fist_surface, True, False),
+                    x_offset, 30)
             
         else:  # kick
             # Draw leg with darker red
@@ -339,11 +1103,86 @@ class AttackAnimation:
             pygame.draw.circle(leg_surface, (180, 0, 0, alpha), (self.width - 8, self.height//2), 8)
             
             extend = int(100 * (1 - progress))
-            x_offset = extend if self.facing_right else -extend
-            angle = 20 if self.facing_right else -20
+            x_offset = extend if facing_right else -extend
+            angle = 20 if facing_right else -20
             
-            rotated_leg = pygame.transform.rotate(leg_surface, angle)
-            screen.blit(rotated_leg, (self.x + x_offset, self.y + 50))
+            return pygame.transform.rotate(leg_surface, angle), x_offset, 50
+
+# Number of fade levels baked into particle sprites
+PARTICLE_ALPHA_STEPS = 16
+
+# Reusable particle emitter backed by preallocated ring-buffer arrays
+class ParticleEmitter:
+    def __init__(self, color, radius=3, lifetime=30, capacity=256):
+        self.color = color
+        self.radius = radius
+        self.lifetime = lifetime
+        self.capacity = capacity
+        self.head = 0  # Next slot to write; the oldest particle is overwritten when full
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.dx = np.zeros(capacity)
+        self.dy = np.zeros(capacity)
+        self.life = np.zeros(capacity, dtype=np.int32)
+
+        # Pre-rendered dot for each fade level so drawing is a single batched blit
+        self.sprites = []
+        for step in range(1, PARTICLE_ALPHA_STEPS + 1):
+            sprite = pygame.Surface((radius * 2 + 1, radius * 2 + 1), pygame.SRCALPHA)
+            alpha = int(255 * step / PARTICLE_ALPHA_STEPS)
+            pygame.draw.circle(sprite, (*color, alpha), (radius, radius), radius)
+            self.sprites.append(sprite)
+
+    def emit(self, x, y, dx, dy):
+        i = self.head
+        self.x[i] = x
+        self.y[i] = y
+        self.dx[i] = dx
+        self.dy[i] = dy
+        self.life[i] = self.lifetime
+        self.head = (i + 1) % self.capacity
+
+    def emit_burst(self, x, y, angles, speeds, offset=0):
+        # Emit many particles at once, radiating from (x, y)
+        angles = np.asarray(angles)
+        count = min(len(angles), self.capacity)
+        slots = (self.head + np.arange(count)) % self.capacity
+        cos, sin = np.cos(angles[:count]), np.sin(angles[:count])
+        self.x[slots] = x + cos * offset
+        self.y[slots] = y + sin * offset
+        self.dx[slots] = cos * np.asarray(speeds)[:count]
+        self.dy[slots] = sin * np.asarray(speeds)[:count]
+        self.life[slots] = self.lifetime
+        self.head = (self.head + count) % self.capacity
+
+    def update(self):
+        alive = self.life > 0
+        self.x += self.dx
+        self.y += self.dy
+        np.subtract(self.life, 1, out=self.life, where=alive)
+
+    def clear(self):
+        self.life[:] = 0
+
+    def __len__(self):
+        return int(np.count_nonzero(self.life))
+
+    def draw(self, screen):
+        alive = np.flatnonzero(self.life)
+        if len(alive) == 0:
+            return None
+        # Fade level from remaining life, rounded up so fresh particles are fully opaque
+        steps = (self.life[alive] * PARTICLE_ALPHA_STEPS + self.lifetime - 1) // self.lifetime - 1
+        sprites = self.sprites
+        radius = self.radius
+        xs = self.x[alive].astype(int)
+        ys = self.y[alive].astype(int)
+        screen.blits([(sprites[step], (x - radius, y - radius)) for step, x, y in
+                      zip(steps.tolist(), xs.tolist(), ys.tolist())],
+                     doreturn=False)
+        # One box around the whole cloud of particles
+        left, top = int(xs.min()) - radius, int(ys.min()) - radius
+        return pygame.Rect(left, top, int(xs.max()) + radius + 1 - left, int(ys.max()) + radius + 1 - top)
 
 class Portal:
     def __init__(self, x, y):
@@ -352,7 +1191,7 @@ class Portal:
         self.radius = 0
         self.max_radius = 100
         self.growing = True
-        self.particles = []
+        self.particles = ParticleEmitter(PURPLE, 3)
 
     def update(self):
         if self.growing:
@@ -361,71 +1200,74 @@ class Portal:
             self.radius = max(self.radius - 2, 0)
 
         # Add particles
-        if random.random() < 0.3:
-            angle = random.uniform(0, 2 * math.pi)
-            speed = random.uniform(1, 3)
-            self.particles.append({
-                'x': self.x + math.cos(angle) * self.radius,
-                'y': self.y + math.sin(angle) * self.radius,
-                'dx': math.cos(angle) * speed,
-                'dy': math.sin(angle) * speed,
-                'life': 30
-            })
+        if RNG.fx.random() < 0.3:
+            angle = RNG.fx.uniform(0, 2 * math.pi)
+            speed = RNG.fx.uniform(1, 3)
+            self.particles.emit(self.x + math.cos(angle) * self.radius,
+                                self.y + math.sin(angle) * self.radius,
+                                math.cos(angle) * speed,
+                                math.sin(angle) * speed)
 
         # Update particles
-        for particle in self.particles[:]:
-            particle['x'] += particle['dx']
-            particle['y'] += particle['dy']
-            particle['life'] -= 1
-            if particle['life'] <= 0:
-                self.particles.remove(particle)
+        self.particles.update()
+
+    def burst(self, count):
+        # Ring of particles thrown out from the portal edge
+        angles = [RNG.fx.uniform(0, 2 * math.pi) for _ in range(count)]
+        speeds = [RNG.fx.uniform(2, 6) for _ in range(count)]
+        self.particles.emit_burst(self.x, self.y, angles, speeds, self.radius)
 
     def draw(self, screen):
         # Draw portal
         pygame.draw.circle(screen, PURPLE, (int(self.x), int(self.y)), self.radius)
-        pygame.draw.circle(screen, (*PURPLE, 128), (int(self.x), int(self.y)), self.radius + 10)
+        rect = pygame.draw.circle(screen, (*PURPLE, 128), (int(self.x), int(self.y)), self.radius + 10)
 
         # Draw particles
-        for particle in self.particles:
-            alpha = int(255 * (particle['life'] / 30))
-            pygame.draw.circle(screen, (*PURPLE, alpha), 
-                             (int(particle['x']), int(particle['y'])), 3)
+        return bounding_rect(rect, self.particles.draw(screen))
 
 class SkibidiToilet:
+    __slots__ = ('width', 'height', 'x', 'y', 'prev_x', 'prev_y', 'velocity_x', 'velocity_y', 'base_speed',
+                 'knockback_resistance', 'health', 'hit_flash', 'color', 'sprite', 'animation',
+                 'animation_phase', 'target_player')
+
     def __init__(self):
         self.width = 50
         self.height = 60
         # Randomly choose spawn side (0: right, 1: top, 2: left, 3: bottom)
-        spawn_side = random.randint(0, 3)
+        spawn_side = RNG.spawn.randint(0, 3)
         if spawn_side == 0:  # Right side
             self.x = WINDOW_WIDTH
-            self.y = random.randint(0, WINDOW_HEIGHT - self.height)
-            self.velocity_x = -random.uniform(2, 3)
+            self.y = RNG.spawn.randint(0, WINDOW_HEIGHT - self.height)
+            self.velocity_x = -RNG.spawn.uniform(2, 3)
             self.velocity_y = 0
         elif spawn_side == 1:  # Top side
-            self.x = random.randint(0, WINDOW_WIDTH - self.width)
+            self.x = RNG.spawn.randint(0, WINDOW_WIDTH - self.width)
             self.y = -self.height
             self.velocity_x = 0
-            self.velocity_y = random.uniform(2, 3)
+            self.velocity_y = RNG.spawn.uniform(2, 3)
         elif spawn_side == 2:  # Left side
             self.x = -self.width
-            self.y = random.randint(0, WINDOW_HEIGHT - self.height)
-            self.velocity_x = random.uniform(2, 3)
+            self.y = RNG.spawn.randint(0, WINDOW_HEIGHT - self.height)
+            self.velocity_x = RNG.spawn.uniform(2, 3)
             self.velocity_y = 0
         else:  # Bottom side
-            self.x = random.randint(0, WINDOW_WIDTH - self.width)
+            self.x = RNG.spawn.randint(0, WINDOW_WIDTH - self.width)
             self.y = WINDOW_HEIGHT
             self.velocity_x = 0
-            self.velocity_y = -random.uniform(2, 3)
+            self.velocity_y = -RNG.spawn.uniform(2, 3)
         
-        self.base_speed = random.uniform(2, 3)
+        self.base_speed = RNG.spawn.uniform(2, 3)
         self.knockback_resistance = 0.90
         self.health = 30
         self.sprite = TOILET_SPRITE
         self.hit_flash = 0
         self.target_player = None
+        self.prev_x = None  # Position at the start of the tick, for render interpolation
+        self.prev_y = None
         self.color = (255, 255, 255)  # Pure white for normal toilets
         self.animation = TOILET_ANIMATION
+        # Offset into the shared animation so toilets don't all move in lockstep
+        self.animation_phase = RNG.fx.randint(0, self.animation.total_duration) if self.animation.frames else 0
 
     def apply_knockback(self, force_x, force_y):
         self.velocity_x += force_x
@@ -455,120 +1297,273 @@ class SkibidiToilet:
     def draw(self, screen):
         # Update animation frame if available
         if self.animation and self.animation.frames:
-            self.sprite = self.animation.update(1000/FPS)  # Convert FPS to milliseconds
+            self.sprite = self.animation.frame_at(ANIMATION_CLOCK.time_ms, self.animation_phase)
             
-        # Create a colored version of the sprite
-        colored_sprite = self.sprite.copy()
-        # Apply color tint more strongly
-        color_surface = pygame.Surface(colored_sprite.get_size(), pygame.SRCALPHA)
-        color_surface.fill((*self.color, 255))
-        colored_sprite.blit(color_surface, (0, 0), special_flags=pygame.BLEND_RGBA_MULT)
-        
-        if self.hit_flash > 0 and self.hit_flash % 2 == 0:
-            # Create a white flash effect when hit
-            white_sprite = colored_sprite.copy()
-            white_sprite.fill((255, 255, 255, 128), special_flags=pygame.BLEND_RGBA_MULT)
-            screen.blit(white_sprite, (self.x, self.y))
-        else:
-            screen.blit(colored_sprite, (self.x, self.y))
+        # Blit the cached tinted version of the current frame
+        flashing = self.hit_flash > 0 and self.hit_flash % 2 == 0
+        rect = screen.blit(get_tinted_sprite(self.sprite, self.color, flashing), (self.x, self.y))
         
         # Draw health bar above toilet
         if self.health < 30:  # Only show health bar if damaged
             bar_width = 40
             bar_height = 5
             health_percent = self.health / 30
-            pygame.draw.rect(screen, BLACK, (self.x + 4, self.y - 11, bar_width + 2, bar_height + 2))
+            rect = bounding_rect(rect, pygame.draw.rect(screen, BLACK, (self.x + 4, self.y - 11, bar_width + 2, bar_height + 2)))
             pygame.draw.rect(screen, RED, (self.x + 5, self.y - 10, bar_width, bar_height))
             pygame.draw.rect(screen, GREEN, (self.x + 5, self.y - 10, bar_width * health_percent, bar_height))
+        return rect
+
+    def update_weapon(self):
+        pass
+
+# Enemy count at which toilet movement switches to the batched NumPy kernel
+VECTORIZED_MOVE_THRESHOLD = 64
+
+# Structure-of-arrays store that advances every toilet in one batched step
+class EnemyStore:
+    # Per-row fields copied from each toilet; subclasses differ only in their values
+    STATIC_FIELDS = ('base_speed', 'knockback_resistance', 'width', 'height')
+    DYNAMIC_FIELDS = ('x', 'y', 'velocity_x', 'velocity_y', 'hit_flash')
+
+    def __init__(self, capacity=256):
+        self.count = 0
+        self.capacity = 0
+        self.roster = []
+        self.grow(capacity)
+
+    def grow(self, capacity):
+        for name in self.STATIC_FIELDS + self.DYNAMIC_FIELDS + ('target_x', 'target_y'):
+            new_array = np.zeros(capacity)
+            if self.capacity:
+                new_array[:self.capacity] = getattr(self, name)
+            setattr(self, name, new_array)
+        has_target = np.zeros(capacity, dtype=bool)
+        if self.capacity:
+            has_target[:self.capacity] = self.has_target
+        self.has_target = has_target
+        self.capacity = capacity
+
+    def load(self, enemies):
+        n = len(enemies)
+        if n > self.capacity:
+            self.grow(max(n, self.capacity * 2))
+        self.count = n
+        # Per-type parameters only change when toilets spawn or die
+        if self.roster != enemies:
+            self.roster = list(enemies)
+            for name in self.STATIC_FIELDS:
+                getattr(self, name)[:n] = list(map(attrgetter(name), enemies))
+        for name in self.DYNAMIC_FIELDS:
+            getattr(self, name)[:n] = list(map(attrgetter(name), enemies))
+        targets = list(map(attrgetter('target_player'), enemies))
+        self.has_target[:n] = [target is not None for target in targets]
+        self.target_x[:n] = [target.x if target else 0 for target in targets]
+        self.target_y[:n] = [target.y if target else 0 for target in targets]
+
+    def step(self):
+        n = self.count
+        x, y = self.x[:n], self.y[:n]
+        velocity_x, velocity_y = self.velocity_x[:n], self.velocity_y[:n]
+        base_speed = self.base_speed[:n]
+
+        # Move towards player with slight tracking
+        dx = self.target_x[:n] - x
+        dy = self.target_y[:n] - y
+        dist = np.sqrt(dx * dx + dy * dy)
+        tracking = self.has_target[:n] & (dist > 0)
+        safe_dist = np.where(tracking, dist, 1.0)
+        velocity_x[:] = np.where(tracking, velocity_x * 0.95 + (dx / safe_dist * base_speed) * 0.05, velocity_x)
+        velocity_y[:] = np.where(tracking, velocity_y * 0.95 + (dy / safe_dist * base_speed) * 0.05, velocity_y)
+
+        # Apply knockback resistance
+        velocity_x *= self.knockback_resistance[:n]
+        velocity_y *= self.knockback_resistance[:n]
+
+        # Update position with boundaries
+        x[:] = np.maximum(-self.width[:n], np.minimum(WINDOW_WIDTH, x + velocity_x))
+        y[:] = np.maximum(-self.height[:n], np.minimum(WINDOW_HEIGHT, y + velocity_y))
+
+        hit_flash = self.hit_flash[:n]
+        hit_flash[hit_flash > 0] -= 1
+
+    def store(self, enemies):
+        n = self.count
+        for enemy, x, y, velocity_x, velocity_y, hit_flash in zip(
+                enemies, self.x[:n].tolist(), self.y[:n].tolist(),
+                self.velocity_x[:n].tolist(), self.velocity_y[:n].tolist(), self.hit_flash[:n].tolist()):
+            enemy.x = x
+            enemy.y = y
+            enemy.velocity_x = velocity_x
+            enemy.velocity_y = velocity_y
+            enemy.hit_flash = int(hit_flash)
+
+    def move_all(self, enemies):
+        self.load(enemies)
+        self.step()
+        self.store(enemies)
+        for enemy in enemies:
+            enemy.update_weapon()
 
 class FastSkibidi(SkibidiToilet):
+    __slots__ = ()
+
     def __init__(self):
         self.health = 20  # Set health before parent init
         super().__init__()
-        self.base_speed = random.uniform(6, 7)  # Increased from 4-5 to 6-7
+        self.base_speed = RNG.spawn.uniform(6, 7)  # Increased from 4-5 to 6-7
         self.color = (0, 0, 255)  # Pure blue for fast toilets
         self.knockback_resistance = 0.95  # More resistant to knockback
 
+def draw_poop_emoji(screen, x, y, size):
+    # Draw main poop shape
+    rect = pygame.draw.circle(screen, DARK_BROWN, (int(x), int(y)), size)
+    # Add highlights
+    pygame.draw.circle(screen, LIGHT_BROWN, (int(x - size/3), int(y - size/3)), size//3)
+    pygame.draw.circle(screen, LIGHT_BROWN, (int(x + size/3), int(y - size/3)), size//4)
+    # Add eyes (small white circles with black dots)
+    eye_size = max(2, size//3)
+    pygame.draw.circle(screen, WHITE, (int(x - size/4), int(y - size/6)), eye_size)
+    pygame.draw.circle(screen, WHITE, (int(x + size/4), int(y - size/6)), eye_size)
+    pygame.draw.circle(screen, BLACK, (int(x - size/4), int(y - size/6)), max(1, eye_size//2))
+    pygame.draw.circle(screen, BLACK, (int(x + size/4), int(y - size/6)), max(1, eye_size//2))
+    # Add smile
+    smile_points = [
+        (int(x - size/3), int(y + size/4)),
+        (int(x), int(y + size/2)),
+        (int(x + size/3), int(y + size/4))
+    ]
+    return bounding_rect(rect, pygame.draw.lines(screen, BLACK, False, smile_points, max(1, size//4)))
+
+# Global pool of enemy projectiles with fixed capacity and array-backed fields
+class ProjectilePool:
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self.count = 0
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.dx = np.zeros(capacity)
+        self.dy = np.zeros(capacity)
+        self.lifetime = np.zeros(capacity, dtype=np.int32)
+        self.size = np.zeros(capacity, dtype=np.int32)
+        self.owner = [None] * capacity
+
+    def spawn(self, x, y, dx, dy, lifetime, size, owner=None):
+        if self.count >= self.capacity:
+            return False  # Pool is full, drop the shot
+        i = self.count
+        self.x[i] = x
+        self.y[i] = y
+        self.dx[i] = dx
+        self.dy[i] = dy
+        self.lifetime[i] = lifetime
+        self.size[i] = size
+        self.owner[i] = owner
+        self.count += 1
+        return True
+
+    def release(self, i):
+        # Swap-remove: move the last live projectile into the freed slot
+        last = self.count - 1
+        if i != last:
+            self.x[i] = self.x[last]
+            self.y[i] = self.y[last]
+            self.dx[i] = self.dx[last]
+            self.dy[i] = self.dy[last]
+            self.lifetime[i] = self.lifetime[last]
+            self.size[i] = self.size[last]
+            self.owner[i] = self.owner[last]
+        self.owner[last] = None
+        self.count = last
+
+    def release_all(self, indices):
+        # Highest index first so swapped-in rows are never ones still pending release
+        for i in sorted(indices.tolist(), reverse=True):
+            self.release(i)
+
+    def clear(self):
+        self.owner[:self.count] = [None] * self.count
+        self.count = 0
+
+    def update(self, player=None):
+        n = self.count
+        if n == 0:
+            return
+        self.x[:n] += self.dx[:n]
+        self.y[:n] += self.dy[:n]
+        self.lifetime[:n] -= 1
+
+        # Check collision with player if not riding Donkey
+        if player and not player.donkey:
+            dx = self.x[:n] - (player.x + player.width/2)
+            dy = self.y[:n] - (player.y + player.height/2)
+            dist_sq = dx * dx + dy * dy
+            hits = np.flatnonzero(dist_sq < 30 * 30)  # Hit radius
+            # Plain floats from here on, so numpy scalars never leak into entity state
+            for hit_dx, hit_dy, hit_dist_sq in zip(dx[hits].tolist(), dy[hits].tolist(), dist_sq[hits].tolist()):
+                dist = math.sqrt(hit_dist_sq) or 1
+                player.health -= 10  # Damage amount
+                player.poop_stain_timer = POOP_STAIN_DURATION
+                # Apply knockback
+                knockback_force = 8
+                player.apply_knockback(hit_dx/dist * knockback_force, hit_dy/dist * knockback_force)
+            self.lifetime[hits] = 0
+
+        self.release_all(np.flatnonzero(self.lifetime[:self.count] <= 0))
+
+    def collide_clouds(self, clouds):
+        # Fart clouds block any projectile inside them
+        for cloud in clouds:
+            n = self.count
+            if n == 0:
+                return
+            dx = self.x[:n] - cloud.x
+            dy = self.y[:n] - cloud.y
+            self.release_all(np.flatnonzero(dx * dx + dy * dy < cloud.radius * cloud.radius))
+
+    def draw(self, screen, alpha=1.0):
+        # Draw projectiles as poop emojis, stepped back to the interpolated position
+        n = self.count
+        xs = self.x[:n]
+        ys = self.y[:n]
+        if alpha < 1.0:
+            xs = xs + self.dx[:n] * (alpha - 1.0)
+            ys = ys + self.dy[:n] * (alpha - 1.0)
+        # One rect per projectile, since they can be anywhere on screen
+        return [draw_poop_emoji(screen, x, y, size) for x, y, size in zip(xs.tolist(), ys.tolist(), self.size[:n].tolist())]
+
+PROJECTILE_POOL = ProjectilePool()
+
 class GunnerSkibidi(SkibidiToilet):
+    __slots__ = ('reload_time', 'shoot_cooldown')
+
     def __init__(self):
         super().__init__()
-        self.base_speed = random.uniform(1.5, 2)  # Slower
+        self.base_speed = RNG.spawn.uniform(1.5, 2)  # Slower
         self.health = 40  # More health
         self.color = (255, 128, 128)  # Light red for gunner toilets
         self.shoot_cooldown = 0
         self.reload_time = 150  # Increased from 90 to 150 (2.5 seconds between shots)
-        self.projectiles = []
-
-    def draw_poop_emoji(self, screen, x, y, size):
-        # Draw main poop shape
-        pygame.draw.circle(screen, DARK_BROWN, (int(x), int(y)), size)
-        # Add highlights
-        pygame.draw.circle(screen, LIGHT_BROWN, (int(x - size/3), int(y - size/3)), size//3)
-        pygame.draw.circle(screen, LIGHT_BROWN, (int(x + size/3), int(y - size/3)), size//4)
-        # Add eyes (small white circles with black dots)
-        eye_size = max(2, size//3)
-        pygame.draw.circle(screen, WHITE, (int(x - size/4), int(y - size/6)), eye_size)
-        pygame.draw.circle(screen, WHITE, (int(x + size/4), int(y - size/6)), eye_size)
-        pygame.draw.circle(screen, BLACK, (int(x - size/4), int(y - size/6)), max(1, eye_size//2))
-        pygame.draw.circle(screen, BLACK, (int(x + size/4), int(y - size/6)), max(1, eye_size//2))
-        # Add smile
-        smile_points = [
-            (int(x - size/3), int(y + size/4)),
-            (int(x), int(y + size/2)),
-            (int(x + size/3), int(y + size/4))
-        ]
-        pygame.draw.lines(screen, BLACK, False, smile_points, max(1, size//4))
 
     def move(self):
         super().move()
+        self.update_weapon()
+
+    def update_weapon(self):
         if self.target_player and self.shoot_cooldown <= 0:
             # Shoot at player
             dx = self.target_player.x - self.x
             dy = self.target_player.y - self.y
             dist = math.sqrt(dx * dx + dy * dy)
             if dist > 0 and dist < 400:  # Only shoot if within range
-                self.projectiles.append({
-                    'x': self.x + self.width/2,
-                    'y': self.y + self.height/2,
-                    'dx': dx/dist * 3.5,
-                    'dy': dy/dist * 3.5,
-                    'lifetime': 120,
-                    'size': 10
-                })
+                PROJECTILE_POOL.spawn(self.x + self.width/2, self.y + self.height/2,
+                                      dx/dist * 3.5, dy/dist * 3.5, 120, 10, self)
                 self.shoot_cooldown = self.reload_time  # Use the new reload_time
         
         self.shoot_cooldown = max(0, self.shoot_cooldown - 1)
-        
-        # Update projectiles
-        for proj in self.projectiles[:]:
-            proj['x'] += proj['dx']
-            proj['y'] += proj['dy']
-            proj['lifetime'] -= 1
-            
-            # Check collision with player if not riding Donkey
-            if self.target_player and not self.target_player.donkey:
-                dx = proj['x'] - (self.target_player.x + self.target_player.width/2)
-                dy = proj['y'] - (self.target_player.y + self.height/2)
-                dist = math.sqrt(dx * dx + dy * dy)
-                if dist < 30:  # Hit radius
-                    self.target_player.health -= 10  # Damage amount
-                    self.target_player.poop_stain_timer = 120  # 2 seconds at 60 FPS
-                    # Apply knockback
-                    knockback_force = 8
-                    self.target_player.apply_knockback(dx/dist * knockback_force, dy/dist * knockback_force)
-                    self.projectiles.remove(proj)
-                    continue
-            
-            if proj['lifetime'] <= 0:
-                self.projectiles.remove(proj)
-
-    def draw(self, screen):
-        super().draw(screen)
-        # Draw projectiles as poop emojis
-        for proj in self.projectiles:
-            self.draw_poop_emoji(screen, proj['x'], proj['y'], proj['size'])
 
 class SkibidiBoss(SkibidiToilet):
+    __slots__ = ('max_health', 'name', 'attack_cooldown', 'attack_pattern', 'crown_points', 'projectile_spread')
+
     def __init__(self):
         super().__init__()
         self.width = 200  # Increased from 150 to 200
@@ -578,10 +1573,11 @@ class SkibidiBoss(SkibidiToilet):
         self.base_speed = 1.5
         self.attack_cooldown = 0
         self.attack_pattern = 0
-        self.sprite = pygame.transform.scale(TOILET_SPRITE, (200, 240))  # Match new dimensions
+        self.use_scaled_animation()
         self.color = (255, 50, 50)  # More intense red for first boss
         self.knockback_resistance = 0.95  # Added higher knockback resistance
         self.name = "Evil Toilet"  # Added boss name
+        self.projectile_spread = 3  # Poops per projectile attack
         # Update crown points for larger size
         self.crown_points = [
             (self.width//2 - 40, -25),  # Left point
@@ -614,36 +1610,38 @@ class SkibidiBoss(SkibidiToilet):
 
         return []
 
+    def use_scaled_animation(self):
+        # Animate at full boss size from the shared scaled frames
+        self.animation = get_scaled_animation('TOILET_ANIMATION', self.width, self.height)
+        self.sprite = self.animation.get_current_frame() or pygame.transform.scale(TOILET_SPRITE, (self.width, self.height))
+
+    def fire_projectiles(self, player):
+        # Fan of poop aimed at the player
+        center_x = self.x + self.width/2
+        center_y = self.y + self.height/2
+        aim = math.atan2(player.y + player.height/2 - center_y, player.x + player.width/2 - center_x)
+        for i in range(self.projectile_spread):
+            angle = aim + (i - (self.projectile_spread - 1) / 2) * 0.25
+            PROJECTILE_POOL.spawn(center_x, center_y, math.cos(angle) * 4, math.sin(angle) * 4, 150, 14, self)
+
     def draw(self, screen):
-        super().draw(screen)
-        # Draw crown on top
+        body_rect = super().draw(screen)
+        # Draw crown on top, rendered once per boss shape
+        key = ('crown', self.width, tuple(self.crown_points))
+        crown_surface = EFFECT_ATLAS.get(key)
+        if crown_surface is None:
+            crown_surface = EFFECT_ATLAS[key] = self.render_crown()
+        # The name and health bar are part of the HUD (see Hud.draw_boss)
+        return bounding_rect(body_rect, screen.blit(crown_surface, (self.x, self.y)))
+
+    def render_crown(self):
         crown_surface = pygame.Surface((self.width, 40), pygame.SRCALPHA)
         pygame.draw.polygon(crown_surface, (255, 215, 0), self.crown_points)  # Gold crown
-        screen.blit(crown_surface, (self.x, self.y))
-        
-        # Draw boss health bar at the bottom of the screen
-        bar_width = 400
-        bar_height = 20
-        health_percent = self.health / self.max_health
-        
-        # Draw boss name above health bar
-        name_font = pygame.font.Font(None, 48)  # Larger font for boss name
-        name_text = name_font.render(self.name, True, WHITE)
-        name_shadow = name_font.render(self.name, True, BLACK)
-        
-        # Draw name with shadow effect
-        screen.blit(name_shadow, (WINDOW_WIDTH//2 - name_text.get_width()//2 + 2, WINDOW_HEIGHT - 62))
-        screen.blit(name_text, (WINDOW_WIDTH//2 - name_text.get_width()//2, WINDOW_HEIGHT - 64))
-        
-        # Draw health bar
-        pygame.draw.rect(screen, BLACK, (WINDOW_WIDTH//2 - bar_width//2 - 2, WINDOW_HEIGHT - 30 - 2, 
-                                       bar_width + 4, bar_height + 4))
-        pygame.draw.rect(screen, RED, (WINDOW_WIDTH//2 - bar_width//2, WINDOW_HEIGHT - 30, 
-                                     bar_width, bar_height))
-        pygame.draw.rect(screen, GREEN, (WINDOW_WIDTH//2 - bar_width//2, WINDOW_HEIGHT - 30, 
-                                       int(bar_width * health_percent), bar_height))
+        return crown_surface
 
 class SuperSkibidiBoss(SkibidiBoss):
+    __slots__ = ('max_fragments', 'missile_cooldown')
+
     def __init__(self):
         super().__init__()
         self.width = 300  # Increased from 200 to 300
@@ -651,9 +1649,9 @@ class SuperSkibidiBoss(SkibidiBoss):
         self.health = 400
         self.max_health = 400
         self.base_speed = 2.0
-        self.sprite = pygame.transform.scale(TOILET_SPRITE, (300, 360))  # Match new dimensions
+        self.use_scaled_animation()
         self.color = (200, 50, 255)  # More intense purple color
-        self.missiles = []
+        self.projectile_spread = 5
         self.missile_cooldown = 0
         self.max_fragments = 32
         self.knockback_resistance = 0.97
@@ -667,32 +1665,10 @@ class SuperSkibidiBoss(SkibidiBoss):
             (self.width//2 + 60, -35)   # Right point
         ]
 
-    def draw(self, screen):
-        super().draw(screen)  # Draw the main boss and crown
-        
-        # Draw boss health bar at the bottom of the screen
-        bar_width = 400
-        bar_height = 20
-        health_percent = self.health / self.max_health
-        
-        # Draw boss name above health bar
-        name_font = pygame.font.Font(None, 48)  # Larger font for boss name
-        name_text = name_font.render(self.name, True, WHITE)
-        name_shadow = name_font.render(self.name, True, BLACK)
-        
-        # Draw name with shadow effect
-        screen.blit(name_shadow, (WINDOW_WIDTH//2 - name_text.get_width()//2 + 2, WINDOW_HEIGHT - 62))
-        screen.blit(name_text, (WINDOW_WIDTH//2 - name_text.get_width()//2, WINDOW_HEIGHT - 64))
-        
-        # Draw health bar
-        pygame.draw.rect(screen, BLACK, (WINDOW_WIDTH//2 - bar_width//2 - 2, WINDOW_HEIGHT - 30 - 2, 
-                                       bar_width + 4, bar_height + 4))
-        pygame.draw.rect(screen, RED, (WINDOW_WIDTH//2 - bar_width//2, WINDOW_HEIGHT - 30, 
-                                     bar_width, bar_height))
-        pygame.draw.rect(screen, GREEN, (WINDOW_WIDTH//2 - bar_width//2, WINDOW_HEIGHT - 30, 
-                                       int(bar_width * health_percent), bar_height))
-
 class Donkey:
+    __slots__ = ('width', 'height', 'x', 'y', 'prev_x', 'prev_y', 'velocity_x', 'velocity_y', 'speed',
+                 'facing_right', 'lifetime', 'damage', 'damage_cooldown')
+
     def __init__(self, x, y):
         self.width = 100
         self.height = 80
@@ -705,6 +1681,8 @@ class Donkey:
         self.facing_right = True
         self.velocity_x = 0
         self.velocity_y = 0
+        self.prev_x = None
+        self.prev_y = None
 
     def move(self, target_x, target_y):
         # Calculate direction to target
@@ -725,6 +1703,21 @@ class Donkey:
             self.y += self.velocity_y
 
     def draw(self, screen, shrek_sprite_right, shrek_sprite_left):
+        key = ('donkey', self.facing_right)
+        donkey_surface = EFFECT_ATLAS.get(key)
+        if donkey_surface is None:
+            donkey_surface = EFFECT_ATLAS[key] = self.render()
+
+        # Draw Donkey
+        rect = screen.blit(donkey_surface, (self.x, self.y))
+        
+        # Draw Shrek on top of Donkey with adjusted position
+        shrek_x = self.x + (20 if self.facing_right else 40)  # Adjusted horizontal position
+        shrek_y = self.y - 40  # Lowered Shrek's position
+        return bounding_rect(rect, screen.blit(shrek_sprite_right if self.facing_right else shrek_sprite_left, 
+                                               (shrek_x, shrek_y)))
+
+    def render(self):
         # Simple donkey shape
         donkey_surface = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
         # Body - Made larger
@@ -738,18 +1731,11 @@ class Donkey:
         for i in range(4):
             x = 25 + i * 18
             pygame.draw.rect(donkey_surface, BROWN, (x, 60, 6, 20))
-
-        # Draw Donkey
-        screen.blit(donkey_surface if self.facing_right else pygame.transform.flip(donkey_surface, True, False), 
-                   (self.x, self.y))
-        
-        # Draw Shrek on top of Donkey with adjusted position
-        shrek_x = self.x + (20 if self.facing_right else 40)  # Adjusted horizontal position
-        shrek_y = self.y - 40  # Lowered Shrek's position
-        screen.blit(shrek_sprite_right if self.facing_right else shrek_sprite_left, 
-                   (shrek_x, shrek_y))
+        return donkey_surface if self.facing_right else pygame.transform.flip(donkey_surface, True, False)
 
 class FartCloud:
+    __slots__ = ('x', 'y', 'radius', 'max_radius', 'lifetime', 'alpha', 'damage')
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
@@ -765,17 +1751,50 @@ class FartCloud:
         self.alpha = int((self.lifetime / 45) * 180)
 
     def draw(self, screen):
+        key = ('fart_cloud', self.radius, self.alpha)
+        cloud_surface = EFFECT_ATLAS.get(key)
+        if cloud_surface is None:
+            cloud_surface = EFFECT_ATLAS[key] = self.render()
+        return screen.blit(cloud_surface, (self.x - self.radius, self.y - self.radius))
+
+    def render(self):
         cloud_surface = pygame.Surface((self.radius * 2, self.radius * 2), pygame.SRCALPHA)
         pygame.draw.circle(cloud_surface, (*BROWN, self.alpha), (self.radius, self.radius), self.radius)
-        screen.blit(cloud_surface, (self.x - self.radius, self.y - self.radius))
+        return cloud_surface
+
+# Every frame of the fixed effect animations, rendered once. Keys start with
+# the effect name; draw methods fill in anything missing (an odd state from
+# an old snapshot, say) the first time they meet it.
+EFFECT_ATLAS = {}
+
+def build_effect_atlas():
+    # A cloud's whole life, from when it appears until its lifetime runs out
+    cloud = FartCloud(0, 0)
+    while cloud.lifetime > 0:
+        EFFECT_ATLAS[('fart_cloud', cloud.radius, cloud.alpha)] = cloud.render()
+        cloud.update()
+    for attack_type in ('punch', 'kick'):
+        for facing_right in (True, False):
+            animation = AttackAnimation(0, 0, attack_type, facing_right)
+            for frame in range(animation.max_frames + 1):
+                animation.frame = frame
+                EFFECT_ATLAS[('attack', attack_type, facing_right, frame)] = animation.render()
+    for facing_right in (True, False):
+        donkey = Donkey(0, 0)
+        donkey.facing_right = facing_right
+        EFFECT_ATLAS[('donkey', facing_right)] = donkey.render()
+
+build_effect_atlas()
 
 class Onion:
+    __slots__ = ('x', 'y', 'width', 'height', 'rarity', 'color', 'heal_amount', 'sprite', 'collected', 'pulse_timer')
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
         self.width = 20
         self.height = 20
-        self.rarity = random.choices(['white', 'blue', 'gold'], weights=[70, 25, 5])[0]
+        self.rarity = RNG.loot.choices(['white', 'blue', 'gold'], weights=[70, 25, 5])[0]
         if self.rarity == 'white':
             self.heal_amount = 20  # Increased from 10 to 20
             self.color = WHITE
@@ -790,39 +1809,22 @@ class Onion:
         # Use the loaded onion sprite if available
         self.sprite = ONION_SPRITE if 'ONION_SPRITE' in globals() else None
 
+    def update(self):
+        # Advance the pulsing effect once per tick
+        self.pulse_timer = (self.pulse_timer + 1) % ONION_PULSE_PHASES
+
     def draw(self, screen):
-        if self.sprite:
-            # Create colored version of the sprite based on rarity
-            colored_sprite = self.sprite.copy()
-            if self.rarity == 'blue':
-                colored_sprite.fill((*LIGHT_BLUE, 128), special_flags=pygame.BLEND_RGBA_MULT)
-            elif self.rarity == 'gold':
-                colored_sprite.fill((*GOLD, 128), special_flags=pygame.BLEND_RGBA_MULT)
-            
-            # Apply pulsing effect
-            self.pulse_timer = (self.pulse_timer + 1) % 60
-            pulse = abs(math.sin(self.pulse_timer * 0.1)) * 0.3 + 0.7
-            size = int(self.width * pulse)
-            
-            # Scale sprite with pulse
-            pulsed_sprite = pygame.transform.scale(colored_sprite, (size * 2, size * 2))
-            screen.blit(pulsed_sprite, (self.x + self.width//2 - size, self.y + self.height//2 - size))
-        else:
-            # Fallback to original drawing code
-            # Create pulsing effect
-            self.pulse_timer = (self.pulse_timer + 1) % 60
-            pulse = abs(math.sin(self.pulse_timer * 0.1)) * 0.3 + 0.7
-            size = int(self.width * pulse)
-            
-            # Draw onion layers
-            pygame.draw.circle(screen, self.color, (self.x + self.width//2, self.y + self.height//2), size)
-            pygame.draw.circle(screen, (*self.color, 128), (self.x + self.width//2, self.y + self.height//2), size + 2)
-            
-            # Draw small stem
-            stem_color = (0, 100, 0)
-            pygame.draw.rect(screen, stem_color, (self.x + self.width//2 - 2, self.y + self.height//2 - size, 4, 6))
+        frame, offset_x, offset_y = get_onion_frames(self.sprite, self.rarity, self.color,
+                                                     self.width, self.height)[self.pulse_timer]
+        return screen.blit(frame, (self.x + offset_x, self.y + offset_y))
 
 class Shrek:
+    __slots__ = ('width', 'height', 'x', 'y', 'prev_x', 'prev_y', 'home_x', 'home_y', 'victory_x', 'victory_y',
+                 'velocity_x', 'velocity_y', 'speed', 'knockback_resistance', 'health', 'facing_right',
+                 'sprite_right', 'sprite_left', 'current_sprite', 'punch_cooldown', 'kick_cooldown',
+                 'fart_cooldown', 'attack_animations', 'donkey', 'donkey_charge', 'max_donkey_charge',
+                 'donkey_ready_flash', 'poop_stain_timer')
+
     def __init__(self):
         self.width = 60
         self.height = 80
@@ -851,6 +1853,8 @@ class Shrek:
         self.home_x = WINDOW_WIDTH * 0.85  # Updated to match house in background
         self.home_y = WINDOW_HEIGHT * 0.45  # Updated to match house in background
         self.poop_stain_timer = 0  # Add timer for poop stain effect
+        self.prev_x = None
+        self.prev_y = None
 
     def apply_knockback(self, force_x, force_y):
         self.velocity_x += force_x
@@ -890,57 +1894,33 @@ class Shrek:
         self.y = max(0, min(WINDOW_HEIGHT - self.height, self.y + self.velocity_y))
 
     def draw(self, screen):
+        rects = []
         if not self.donkey:
             # Draw Shrek sprite only if not riding Donkey
-            screen.blit(self.current_sprite, (self.x, self.y))
+            rects.append(screen.blit(self.current_sprite, (self.x, self.y)))
         
         # Draw poop stain overlay if active
         if self.poop_stain_timer > 0:
-            stain_surface = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT), pygame.SRCALPHA)
-            alpha = int((self.poop_stain_timer / 120) * 128)  # Fade out over 2 seconds
-            stain_surface.fill((DARK_BROWN[0], DARK_BROWN[1], DARK_BROWN[2], alpha))
-            screen.blit(stain_surface, (0, 0))
-            self.poop_stain_timer -= 1
+            alpha = int((self.poop_stain_timer / POOP_STAIN_DURATION) * 128)  # Fade out over 2 seconds
+            rects.append(POOP_STAIN_OVERLAY.draw(screen, alpha))
         
-        # Draw health bar with border and background
-        pygame.draw.rect(screen, BLACK, (8, 8, 164, 24))  # Reduced from 204 to 164 (80 * 2 + 4 for border)
-        pygame.draw.rect(screen, (60, 60, 60), (10, 10, 160, 20))  # Reduced from 200 to 160 (80 * 2)
-        pygame.draw.rect(screen, GREEN, (10, 10, self.health * 2, 20))  # Keep multiplier at 2 to maintain same visual size
-
-        # Draw Donkey charge meter with improved visuals
-        if not self.donkey:
-            charge_width = 100
-            charge_height = 20
-            # Draw meter background and border
-            pygame.draw.rect(screen, BLACK, (8, 38, charge_width + 4, charge_height + 4))
-            pygame.draw.rect(screen, (60, 60, 60), (10, 40, charge_width, charge_height))
-            
-            # Draw charge amount
-            charge_amount = (self.donkey_charge / self.max_donkey_charge) * charge_width
-            if charge_amount > 0:
-                if self.donkey_charge >= self.max_donkey_charge:
-                    # Flash effect when fully charged
-                    if self.donkey_ready_flash // 15 % 2 == 0:
-                        pygame.draw.rect(screen, (200, 150, 50), (10, 40, charge_width, charge_height))
-                    else:
-                        pygame.draw.rect(screen, BROWN, (10, 40, charge_width, charge_height))
-                    # Draw "READY!" text and button prompt
-                    ready_font = pygame.font.Font(None, 20)
-                    ready_text = ready_font.render("READY! (SPACE)", True, WHITE)
-                    screen.blit(ready_text, (12, 42))
-                else:
-                    pygame.draw.rect(screen, BROWN, (10, 40, charge_amount, charge_height))
+        # The health bar and Donkey meter are part of the HUD (see Hud.draw_player)
 
         # Draw Donkey if active
         if self.donkey:
-            self.donkey.draw(screen, self.sprite_right, self.sprite_left)
+            rects.append(self.donkey.draw(screen, self.sprite_right, self.sprite_left))
+        return rects
 
-    def punch(self, enemies):
+    def punch(self, enemies, grid=None):
         if self.punch_cooldown <= 0:
             x = self.x + (self.width if self.facing_right else 0)
             self.attack_animations.append(AttackAnimation(x, self.y, 'punch', self.facing_right))
             damage_dealt = 0
-            for enemy in enemies[:]:
+            if grid:
+                targets = grid.query_rect('enemies', self.x - 120, self.y - 100, 240, 200)
+            else:
+                targets = enemies[:]
+            for enemy in targets:
                 if abs(enemy.x - self.x) < 120 and abs(enemy.y - self.y) < 100:
                     enemy.health -= 15
                     damage_dealt += 15
@@ -953,6 +1933,8 @@ class Shrek:
                     enemy.apply_knockback(dx/dist * knockback_force, dy/dist * knockback_force)
                     if enemy.health <= 0:
                         enemies.remove(enemy)
+                        if grid:
+                            grid.remove(enemy)
                         damage_dealt += 25
                         return 100
             if not self.donkey:
@@ -960,12 +1942,16 @@ class Shrek:
             self.punch_cooldown = 20
         return 0
 
-    def kick(self, enemies):
+    def kick(self, enemies, grid=None):
         if self.kick_cooldown <= 0:
             x = self.x + (self.width if self.facing_right else 0)
             self.attack_animations.append(AttackAnimation(x, self.y, 'kick', self.facing_right))
             damage_dealt = 0
-            for enemy in enemies[:]:
+            if grid:
+                targets = grid.query_rect('enemies', self.x - 150, self.y - 100, 300, 200)
+            else:
+                targets = enemies[:]
+            for enemy in targets:
                 if abs(enemy.x - self.x) < 150 and abs(enemy.y - self.y) < 100:
                     enemy.health -= 20
                     damage_dealt += 20
@@ -978,6 +1964,8 @@ class Shrek:
                     enemy.apply_knockback(dx/dist * knockback_force, dy/dist * knockback_force)
                     if enemy.health <= 0:
                         enemies.remove(enemy)
+                        if grid:
+                            grid.remove(enemy)
                         damage_dealt += 25
                         return 100
             if not self.donkey:
@@ -985,7 +1973,7 @@ class Shrek:
             self.kick_cooldown = 30
         return 0
 
-    def update_donkey(self, keys, enemies):
+    def update_donkey(self, keys, enemies, grid=None, layer='enemies'):
         # Update ready flash effect
         if self.donkey_charge >= self.max_donkey_charge:
             self.donkey_ready_flash += 1
@@ -1006,7 +1994,11 @@ class Shrek:
                 # Check for enemy collision
                 if self.donkey.damage_cooldown > 0:
                     self.donkey.damage_cooldown -= 1
-                for enemy in enemies[:]:
+                if grid:
+                    targets = grid.query_rect(layer, self.donkey.x - 50, self.donkey.y - 40, 100, 80)
+                else:
+                    targets = enemies[:]
+                for enemy in targets:
                     if (abs(enemy.x - self.donkey.x) < 50 and 
                         abs(enemy.y - self.donkey.y) < 40 and 
                         self.donkey.damage_cooldown <= 0):
@@ -1014,6 +2006,8 @@ class Shrek:
                         enemy.hit_flash = 10
                         if enemy.health <= 0:
                             enemies.remove(enemy)
+                            if grid:
+                                grid.remove(enemy)
                         self.donkey.damage_cooldown = 20
 
     def move_towards_home(self):
@@ -1031,638 +2025,1387 @@ class VictoryPortal(Portal):
     def __init__(self, x, y):
         super().__init__(x, y)
         self.color = (255, 165, 0)  # Orange color for victory portal
-        self.particles = []
+        self.particles = ParticleEmitter(self.color, 2)
         self.max_radius = 60  # Smaller than boss portal
 
     def draw(self, screen):
         # Draw portal with orange glow
         pygame.draw.circle(screen, self.color, (int(self.x), int(self.y)), self.radius)
-        pygame.draw.circle(screen, (*self.color, 128), (int(self.x), int(self.y)), self.radius + 5)
+        rect = pygame.draw.circle(screen, (*self.color, 128), (int(self.x), int(self.y)), self.radius + 5)
 
         # Draw particles
-        for particle in self.particles:
-            alpha = int(255 * (particle['life'] / 30))
-            pygame.draw.circle(screen, (*self.color, alpha), 
-                             (int(particle['x']), int(particle['y'])), 2)
+        return bounding_rect(rect, self.particles.draw(screen))
 
-async def main():
-    clock = pygame.time.Clock()
-    shrek = Shrek()
-    enemies = []
-    fart_clouds = []
-    onions = []  # Add onions list
-    onion_spawn_timer = 0  # Add spawn timer
-    score = 0
-    font = pygame.font.Font(None, 36)
-    enemy_spawn_timer = 0
-    running = True
-    
-    # Wave system
-    current_wave = 1
-    wave_enemies_remaining = 0
-    game_state = TITLE_SCREEN
-    wave_announcement_timer = 0
-    boss = None
-    portal = None
-    
-    # Create pause overlay surface
-    pause_overlay = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT), pygame.SRCALPHA)
-    pygame.draw.rect(pause_overlay, (0, 0, 0, 128), pause_overlay.get_rect())
-    
-    # Create fonts
-    try:
-        title_font = pygame.font.Font("freesansbold.ttf", 72)  # Larger size for title
-        menu_font = pygame.font.Font("freesansbold.ttf", 36)   # Regular size for menu items
-    except:
-        title_font = pygame.font.Font(None, 72)  # Fallback if freesansbold isn't available
-        menu_font = pygame.font.Font(None, 36)
-    
-    # Create pause button surface and rect for click detection
-    pause_button = pygame.Surface((40, 40))
-    pause_button.fill((60, 60, 60))
-    pygame.draw.rect(pause_button, WHITE, (12, 8, 6, 24))
-    pygame.draw.rect(pause_button, WHITE, (24, 8, 6, 24))
-    pause_button_rect = pygame.Rect(WINDOW_WIDTH - 50, 10, 40, 40)
-    
-    # Add victory animation timer
-    victory_timer = 0
-    victory_stage = 0  # 0: initial message, 1: walking home, 2: final message
-    
-    def start_wave(wave_number):
-        nonlocal wave_enemies_remaining, enemy_spawn_timer, game_state, portal, boss
-        if wave_number != 5 and wave_number != 10:
-            wave_enemies_remaining = wave_number * 4  # Reduced from 5 to 4 enemies per wave level
-            enemy_spawn_timer = 0
-        else:
-            wave_enemies_remaining = 0
-            enemy_spawn_timer = 0
-            portal = Portal(WINDOW_WIDTH//2, WINDOW_HEIGHT//2)
-            game_state = BOSS_INTRO
-            boss = None
-
-    while running:
-        # Handle events
+# Held keys for one tick, indexable like pygame.key.get_pressed()
+class KeyState:
+    def __init__(self, held=()):
+        self.held = frozenset(held)
+
+    def __getitem__(self, key):
+        return key in self.held
+
+# Keyboard and mouse input from the game window
+class LiveInput:
+    def __init__(self, pause_button_rect, hotkeys=None):
+        self.pause_button_rect = pause_button_rect
+        self.hotkeys = hotkeys or {}  # Debug keys handled here and never passed to the game
+
+    def poll(self, tick):
+        presses = []
+        quit_requested = False
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                running = False
+                quit_requested = True
             elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_p and game_state == PLAYING:
-                    game_state = PAUSED
-                elif event.key == pygame.K_p and game_state == PAUSED:
-                    game_state = PLAYING
-                elif game_state == TITLE_SCREEN and event.key == pygame.K_SPACE:
-                    game_state = WAVE_ANNOUNCEMENT
-                    start_wave(current_wave)
-                elif (game_state == GAME_OVER or game_state == VICTORY) and event.key == pygame.K_SPACE:
-                    # Reset game
-                    shrek = Shrek()
-                    enemies = []
-                    fart_clouds = []
-                    onions = []
-                    score = 0
-                    current_wave = 1
-                    boss = None
-                    game_state = WAVE_ANNOUNCEMENT
-                    start_wave(current_wave)
+                if event.key in self.hotkeys:
+                    self.hotkeys[event.key]()
+                else:
+                    presses.append(event.key)
             elif event.type == pygame.MOUSEBUTTONDOWN:
-                if event.button == 1:  # Left click
-                    mouse_pos = pygame.mouse.get_pos()
-                    if pause_button_rect.collidepoint(mouse_pos):
-                        if game_state == PLAYING:
-                            game_state = PAUSED
-                        elif game_state == PAUSED:
-                            game_state = PLAYING
-
-        # Draw background
-        screen.blit(BACKGROUND, (0, 0))
-
-        if game_state == TITLE_SCREEN:
-            # Draw title screen with brown text and red outlines
-            def draw_outlined_text(surface, text, font, pos_x, pos_y):
-                # Draw black outline first for better contrast
-                outline_color = BLACK
-                text_color = WHITE  # Changed to white for better readability
-                outline_surface = font.render(text, True, outline_color)
-                text_surface = font.render(text, True, text_color)
-                
-                # Draw thicker outline by using more offset positions
-                outline_positions = [
-                    (-3,0), (3,0), (0,-3), (0,3),  # Cardinal directions
-                    (-3,-3), (-3,3), (3,-3), (3,3),  # Diagonals
-                    (-2,-2), (-2,2), (2,-2), (2,2),  # Inner diagonals
-                    (-2,0), (2,0), (0,-2), (0,2)     # Inner cardinal
-                ]
-                
-                # Draw outline
-                for dx, dy in outline_positions:
-                    surface.blit(outline_surface, (pos_x + dx, pos_y + dy))
-                
-                # Draw main text
-                surface.blit(text_surface, (pos_x, pos_y))
-            
-            # Calculate positions for center alignment
-            title_x = WINDOW_WIDTH//2 - title_font.size("Skibidi Shrek")[0]//2
-            subtitle_x = WINDOW_WIDTH//2 - title_font.size("Swamp Showdown")[0]//2
-            start_x = WINDOW_WIDTH//2 - menu_font.size("Press SPACE to Start")[0]//2
-            controls1_x = WINDOW_WIDTH//2 - menu_font.size("Movement: WASD or Arrow Keys")[0]//2
-            controls2_x = WINDOW_WIDTH//2 - menu_font.size("SPACE: Summon Donkey when Meter Full")[0]//2
-            attacks_x = WINDOW_WIDTH//2 - menu_font.size("Q: Punch  R: Kick  E: Fart  P: Pause")[0]//2
-            
-            # Draw all menu text with outlines
-            draw_outlined_text(screen, "Skibidi Shrek", title_font, title_x, WINDOW_HEIGHT//4)
-            draw_outlined_text(screen, "Swamp Showdown", title_font, subtitle_x, WINDOW_HEIGHT//4 + 80)
-            draw_outlined_text(screen, "Press SPACE to Start", menu_font, start_x, WINDOW_HEIGHT//2 + 50)
-            draw_outlined_text(screen, "Movement: WASD or Arrow Keys", menu_font, controls1_x, WINDOW_HEIGHT//2 + 100)
-            draw_outlined_text(screen, "SPACE: Summon Donkey when Meter Full", menu_font, controls2_x, WINDOW_HEIGHT//2 + 140)
-            draw_outlined_text(screen, "Q: Punch  R: Kick  E: Fart  P: Pause", menu_font, attacks_x, WINDOW_HEIGHT//2 + 180)
-        
-        elif game_state == WAVE_ANNOUNCEMENT:
-            wave_announcement_timer += 1
-            # Create larger font for wave announcement
-            wave_font = pygame.font.Font(None, 96)  # Increased from default 36 to 96
-            
-            # Show wave announcement with larger text
-            wave_text = wave_font.render(f"Wave {current_wave}", True, WHITE)
-            
-            # Add outline effect for better visibility
-            outline_color = BLACK
-            outline_text = wave_font.render(f"Wave {current_wave}", True, outline_color)
-            
-            # Draw outline
-            for dx, dy in [(-2,0), (2,0), (0,-2), (0,2), (-2,-2), (-2,2), (2,-2), (2,2)]:
-                screen.blit(outline_text, 
-                          (WINDOW_WIDTH//2 - wave_text.get_width()//2 + dx, 
-                           WINDOW_HEIGHT//2 - wave_text.get_height()//2 + dy))
-            
-            # Draw main text
-            screen.blit(wave_text, 
-                      (WINDOW_WIDTH//2 - wave_text.get_width()//2, 
-                       WINDOW_HEIGHT//2 - wave_text.get_height()//2))
-            
-            if wave_announcement_timer > 120:  # 2 seconds at 60 FPS
-                game_state = PLAYING
-                wave_announcement_timer = 0
-
-        elif game_state == BOSS_INTRO:
-            if portal:
-                portal.update()
-                portal.draw(screen)
-                if portal.radius >= portal.max_radius and not boss:
-                    if current_wave == 10:
-                        boss = SuperSkibidiBoss()
+                if event.button == 1 and self.pause_button_rect.collidepoint(event.pos):  # Left click
+                    presses.append(pygame.K_p)  # Same as pressing P
+        return pygame.key.get_pressed(), presses, quit_requested
+
+# Scripted input for runs without a keyboard: a list of (ticks, held keys, pressed keys) steps
+class ScriptedInput:
+    def __init__(self, steps, repeat=True):
+        self.steps = steps
+        self.repeat = repeat
+        self.step_ticks = [ticks for ticks, held, presses in steps]
+        self.total_ticks = sum(self.step_ticks)
+        self.key_states = [KeyState(held) for ticks, held, presses in steps]
+
+    @classmethod
+    def demo(cls):
+        # Walk a square while attacking, summon Donkey when ready, and (re)start from any menu
+        return cls([
+            (1, (), (pygame.K_SPACE,)),
+            (40, (pygame.K_RIGHT, pygame.K_q), ()),
+            (40, (pygame.K_DOWN, pygame.K_r, pygame.K_SPACE), ()),
+            (40, (pygame.K_LEFT, pygame.K_e, pygame.K_q), ()),
+            (40, (pygame.K_UP, pygame.K_r), ()),
+        ])
+
+    def poll(self, tick):
+        if self.repeat:
+            tick %= self.total_ticks
+        elif tick >= self.total_ticks:
+            return KeyState(), [], True  # Script finished
+        for index, ticks in enumerate(self.step_ticks):
+            if tick < ticks:
+                presses = list(self.steps[index][2]) if tick == 0 else []
+                return self.key_states[index], presses, False
+            tick -= ticks
+        return KeyState(), [], False
+
+# All game state and simulation, with no drawing
+class Game:
+    def __init__(self, interpolate=False):
+        self.interpolate = interpolate  # Keep previous positions for smooth rendering
+        self.shrek = Shrek()
+        self.enemies = []
+        self.fart_clouds = []
+        self.onions = []  # Add onions list
+        self.onion_spawn_timer = 0  # Add spawn timer
+        self.score = 0
+        self.enemy_spawn_timer = 0
+        self.running = True
+        self.tick_count = 0
+
+        # Wave system
+        self.current_wave = 1
+        self.wave_enemies_remaining = 0
+        self.game_state = TITLE_SCREEN
+        self.wave_announcement_timer = 0
+        self.boss = None
+        self.portal = None
+
+        # Add victory animation timer
+        self.victory_timer = 0
+        self.victory_stage = 0  # 0: initial message, 1: walking home, 2: final message
+
+        # Healing numbers to show this frame, as (amount, color, x, y)
+        self.heal_popups = []
+
+        # Broad-phase collision grid, rebuilt from the entity lists each tick
+        self.grid = SpatialHash()
+        # Batched movement for large swarms
+        self.enemy_store = EnemyStore()
+
+    def __getstate__(self):
+        # The collision grid and movement store are rebuilt from the entity lists
+        state = self.__dict__.copy()
+        del state['grid']
+        del state['enemy_store']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.grid = SpatialHash()
+        self.enemy_store = EnemyStore()
+
+    def reset(self):
+        self.shrek = Shrek()
+        self.enemies = []
+        self.fart_clouds = []
+        self.onions = []
+        self.score = 0
+        self.current_wave = 1
+        self.boss = None
+
+    def start_wave(self, wave_number):
+        PROJECTILE_POOL.clear()  # Leftover shots don't carry into the next wave
+        self.heal_popups = []  # Nor do heal popups
+        if wave_number != 5 and wave_number != 10:
+            self.wave_enemies_remaining = wave_number * 4  # Reduced from 5 to 4 enemies per wave level
+            self.enemy_spawn_timer = 0
+        else:
+            self.wave_enemies_remaining = 0
+            self.enemy_spawn_timer = 0
+            self.portal = Portal(WINDOW_WIDTH//2, WINDOW_HEIGHT//2)
+            self.game_state = BOSS_INTRO
+            self.boss = None
+
+    def key_down(self, key):
+        if key == pygame.K_p and self.game_state == PLAYING:
+            self.game_state = PAUSED
+        elif key == pygame.K_p and self.game_state == PAUSED:
+            self.game_state = PLAYING
+        elif self.game_state == TITLE_SCREEN and key == pygame.K_SPACE:
+            self.game_state = WAVE_ANNOUNCEMENT
+            self.start_wave(self.current_wave)
+        elif (self.game_state == GAME_OVER or self.game_state == VICTORY) and key == pygame.K_SPACE:
+            # Reset game
+            self.reset()
+            self.game_state = WAVE_ANNOUNCEMENT
+            self.start_wave(self.current_wave)
+
+    def rebuild_collision_grid(self):
+        # Rebuilt from the entity lists, not patched in place, so query order always follows list order
+        grid = self.grid
+        grid.clear()
+        for enemy in self.enemies:
+            grid.insert(enemy, 'enemies', enemy.x, enemy.y, enemy.width, enemy.height)
+        if self.boss:
+            grid.insert(self.boss, 'boss', self.boss.x, self.boss.y, self.boss.width, self.boss.height)
+        for onion in self.onions:
+            grid.insert(onion, 'onions', onion.x, onion.y, onion.width, onion.height)
+        for cloud in self.fart_clouds:
+            grid.insert(cloud, 'clouds', cloud.x - cloud.radius, cloud.y - cloud.radius, cloud.radius * 2, cloud.radius * 2)
+
+    def update(self, keys):
+        # Advance the simulation by one tick
+        self.tick_count += 1
+        if self.interpolate:
+            self.snapshot_positions()
+
+        if self.game_state == WAVE_ANNOUNCEMENT:
+            self.wave_announcement_timer += 1
+            if self.wave_announcement_timer > 120:  # 2 seconds at 60 FPS
+                self.game_state = PLAYING
+                self.wave_announcement_timer = 0
+
+        elif self.game_state == BOSS_INTRO:
+            self.update_boss_intro()
+
+        elif self.game_state == PLAYING:
+            if self.heal_popups:
+                # Age the healing popups; the view only reads them
+                self.heal_popups = [(amount, color, x, y, lifetime - 1)
+                                    for amount, color, x, y, lifetime in self.heal_popups if lifetime > 1]
+            PERF.run('shrek', self.update_shrek, keys)
+            PERF.run('spawning', self.update_spawning)
+            PERF.run('enemies', self.update_enemies)
+            PERF.run('boss', self.update_boss)
+            PERF.run('fart_clouds', self.update_fart_clouds)
+            for onion in self.onions:
+                onion.update()
+            self.check_wave_progress()
+
+        elif self.game_state == VICTORY:
+            self.update_victory()
+
+    def moving_entities(self):
+        entities = [self.shrek]
+        if self.shrek.donkey:
+            entities.append(self.shrek.donkey)
+        entities.extend(self.enemies)
+        if self.boss:
+            entities.append(self.boss)
+        return entities
+
+    def snapshot_positions(self):
+        # Remember where everything was before this tick moves it
+        for entity in self.moving_entities():
+            entity.prev_x = entity.x
+            entity.prev_y = entity.y
+
+    def update_boss_intro(self):
+        portal = self.portal
+        if portal:
+            portal.update()
+            if portal.radius >= portal.max_radius and not self.boss:
+                if self.current_wave == 10:
+                    self.boss = SuperSkibidiBoss()
+                else:
+                    self.boss = SkibidiBoss()
+                self.boss.x = portal.x - self.boss.width//2
+                self.boss.y = portal.y - self.boss.height//2
+                self.boss.target_player = self.shrek
+                portal.burst(200)  # Big flash as the boss comes through
+                portal.growing = False
+            elif portal.radius <= 0:
+                self.portal = None
+                self.game_state = PLAYING
+
+        if not self.portal and self.boss:
+            self.game_state = PLAYING
+
+    def update_shrek(self, keys):
+        shrek = self.shrek
+        grid = self.grid
+        shrek.move(keys)
+        self.rebuild_collision_grid()
+
+        # Fade out the poop stain
+        if shrek.poop_stain_timer > 0:
+            shrek.poop_stain_timer -= 1
+
+        # Check onion collection
+        shrek_center_x = shrek.x + shrek.width/2
+        shrek_center_y = shrek.y + shrek.height/2
+        for onion in grid.query_rect('onions', shrek_center_x - 30, shrek_center_y - 30, 60, 60):
+            if (abs(onion.x + onion.width/2 - (shrek.x + shrek.width/2)) < 30 and 
+                abs(onion.y + onion.height/2 - (shrek.y + shrek.height/2)) < 30):
+                old_health = shrek.health
+                shrek.health = min(80, shrek.health + onion.heal_amount)  # Cap at max health
+                actual_heal = shrek.health - old_health  # Calculate actual amount healed
+                # Create healing number popup
+                if actual_heal > 0:  # Only show popup if actually healed
+                    self.heal_popups.append((actual_heal, onion.color, shrek.x + 30, shrek.y - 20, HEAL_POPUP_DURATION))
+                self.onions.remove(onion)
+                grid.remove(onion)
+
+        # Update cooldowns
+        shrek.punch_cooldown = max(0, shrek.punch_cooldown - 1)
+        shrek.kick_cooldown = max(0, shrek.kick_cooldown - 1)
+        shrek.fart_cooldown = max(0, shrek.fart_cooldown - 1)
+
+        # Update Donkey mechanics
+        if self.boss:
+            shrek.update_donkey(keys, [self.boss], grid, 'boss')
+        else:
+            shrek.update_donkey(keys, self.enemies, grid)
+
+        # Update attack animations
+        shrek.attack_animations = [anim for anim in shrek.attack_animations if anim.update()]
+
+        # Handle attacks (only if not riding Donkey)
+        if not shrek.donkey:
+            # Get keyboard state and handle punch
+            if keys[pygame.K_q] and shrek.punch_cooldown <= 0:
+                # Play punch sound
+                if 'PUNCH_SOUND' in globals() and PUNCH_SOUND:
+                    PUNCH_SOUND.play()
+                # Allow hitting both boss and minions
+                boss = self.boss
+                if boss:
+                    # First check boss
+                    boss_hit = False
+                    if (grid.query_rect('boss', shrek.x - 120, shrek.y - 100, 240, 200) and
+                        abs(boss.x - shrek.x) < 120 and abs(boss.y - shrek.y) < 100):
+                        x = shrek.x + (shrek.width if shrek.facing_right else 0)
+                        shrek.attack_animations.append(AttackAnimation(x, shrek.y, 'punch', shrek.facing_right))
+                        boss.health -= 15
+                        boss.hit_flash = 10
+                        dx = boss.x - shrek.x
+                        dy = boss.y - shrek.y
+                        dist = math.sqrt(dx * dx + dy * dy) or 1
+                        boss.apply_knockback(dx/dist * 5, dy/dist * 5)  # Reduced from 20 to 5
+                        if boss.health <= 0:
+                            self.boss = None
+                            self.score += 1000
+                            boss_hit = True
+                        shrek.punch_cooldown = 20
+                    # Then check minions
+                    if not boss_hit:  # Only add score for one type of hit
+                        self.score += shrek.punch(self.enemies, grid)
+                else:  # No boss, just minions
+                    self.score += shrek.punch(self.enemies, grid)
+            if keys[pygame.K_r] and shrek.kick_cooldown <= 0:
+                # Play kick sound
+                if 'KICK_SOUND' in globals() and KICK_SOUND:
+                    KICK_SOUND.play()
+                boss = self.boss
+                if boss:
+                    # First check boss
+                    boss_hit = False
+                    if (grid.query_rect('boss', shrek.x - 150, shrek.y - 100, 300, 200) and
+                        abs(boss.x - shrek.x) < 150 and abs(boss.y - shrek.y) < 100):
+                        boss.health -= 20
+                        boss.hit_flash = 10
+                        dx = boss.x - shrek.x
+                        dy = boss.y - shrek.y
+                        dist = math.sqrt(dx * dx + dy * dy) or 1
+                        boss.apply_knockback(dx/dist * 6, dy/dist * 6)  # Reduced from 25 to 6
+                        if boss.health <= 0:
+                            self.boss = None
+                            self.score += 1000
+                            boss_hit = True
+                    # Then check minions
+                    if not boss_hit:  # Only add score for one type of hit
+                        self.score += shrek.kick(self.enemies, grid)
+                else:
+                    self.score += shrek.kick(self.enemies, grid)
+            if keys[pygame.K_e] and shrek.fart_cooldown <= 0:
+                # Play fart sound
+                if 'FART_SOUND' in globals() and FART_SOUND:
+                    FART_SOUND.play()
+                self.fart_clouds.append(FartCloud(shrek.x + shrek.width/2, shrek.y + shrek.height/2))
+                shrek.fart_cooldown = 45  # Reduced from 60 to 45
+
+    def update_spawning(self):
+        shrek = self.shrek
+        current_wave = self.current_wave
+
+        # Spawn onions
+        self.onion_spawn_timer += 1
+        if self.onion_spawn_timer >= 600:  # Changed from 1200 to 600 (every 10 seconds instead of 20)
+            if len(self.onions) < 5 and shrek.health < 80:  # Only spawn if Shrek is damaged
+                x = RNG.loot.randint(50, WINDOW_WIDTH - 50)
+                y = RNG.loot.randint(50, WINDOW_HEIGHT - 50)
+                self.onions.append(Onion(x, y))
+            self.onion_spawn_timer = 0
+
+        # Spawn enemies for normal waves
+        if current_wave != 5 and current_wave != 10 and self.wave_enemies_remaining > 0:
+            self.enemy_spawn_timer += 1
+            # Calculate spawn interval based on wave number (gets shorter in later waves)
+            spawn_interval = max(30, 120 - (current_wave * 10))  # Starts at 120, decreases by 10 each wave, minimum 30
+            if self.enemy_spawn_timer >= spawn_interval:
+                # Choose enemy type based on wave and random chance
+                enemy_roll = RNG.spawn.random()
+                if current_wave >= 7:  # More gunners in later waves
+                    if enemy_roll < 0.25 and current_wave >= 3:  # Reduced from 0.4 to 0.25
+                        new_enemy = GunnerSkibidi()
+                    elif enemy_roll < 0.7:  # Increased fast toilet chance
+                        new_enemy = FastSkibidi()
                     else:
-                        boss = SkibidiBoss()
-                    boss.x = portal.x - boss.width//2
-                    boss.y = portal.y - boss.height//2
-                    boss.target_player = shrek
-                    portal.growing = False
-                elif portal.radius <= 0:
-                    portal = None
-                    game_state = PLAYING
-
-            if boss:
-                boss.draw(screen)
-
-            if not portal and boss:
-                game_state = PLAYING
-
-        elif game_state == PLAYING:
-            # Update game state
-            keys = pygame.key.get_pressed()
-            shrek.move(keys)
-
-            # Spawn onions
-            onion_spawn_timer += 1
-            if onion_spawn_timer >= 600:  # Changed from 1200 to 600 (every 10 seconds instead of 20)
-                if len(onions) < 5 and shrek.health < 80:  # Only spawn if Shrek is damaged
-                    x = random.randint(50, WINDOW_WIDTH - 50)
-                    y = random.randint(50, WINDOW_HEIGHT - 50)
-                    onions.append(Onion(x, y))
-                onion_spawn_timer = 0
-
-            # Check onion collection
-            for onion in onions[:]:
-                if (abs(onion.x + onion.width/2 - (shrek.x + shrek.width/2)) < 30 and 
-                    abs(onion.y + onion.height/2 - (shrek.y + shrek.height/2)) < 30):
-                    old_health = shrek.health
-                    shrek.health = min(80, shrek.health + onion.heal_amount)  # Cap at max health
-                    actual_heal = shrek.health - old_health  # Calculate actual amount healed
-                    # Create healing number popup
-                    if actual_heal > 0:  # Only show popup if actually healed
-                        healing_text = font.render(f"+{actual_heal}", True, onion.color)
-                        screen.blit(healing_text, (shrek.x + 30, shrek.y - 20))
-                    onions.remove(onion)
-
-            # Update cooldowns
-            shrek.punch_cooldown = max(0, shrek.punch_cooldown - 1)
-            shrek.kick_cooldown = max(0, shrek.kick_cooldown - 1)
-            shrek.fart_cooldown = max(0, shrek.fart_cooldown - 1)
-
-            # Update Donkey mechanics
-            shrek.update_donkey(keys, enemies if not boss else [boss])
-
-            # Update attack animations
-            shrek.attack_animations = [anim for anim in shrek.attack_animations if anim.update()]
-            for anim in shrek.attack_animations:
-                anim.draw(screen)
-
-            # Handle attacks (only if not riding Donkey)
-            if not shrek.donkey:
-                # Get keyboard state and handle punch
-                if keys[pygame.K_q] and shrek.punch_cooldown <= 0:
-                    # Play punch sound
-                    if 'PUNCH_SOUND' in globals() and PUNCH_SOUND:
-                        PUNCH_SOUND.play()
-                    # Allow hitting both boss and minions
-                    if boss:
-                        # First check boss
-                        boss_hit = False
-                        if abs(boss.x - shrek.x) < 120 and abs(boss.y - shrek.y) < 100:
-                            x = shrek.x + (shrek.width if shrek.facing_right else 0)
-                            shrek.attack_animations.append(AttackAnimation(x, shrek.y, 'punch', shrek.facing_right))
-                            boss.health -= 15
-                            boss.hit_flash = 10
-                            dx = boss.x - shrek.x
-                            dy = boss.y - shrek.y
-                            dist = math.sqrt(dx * dx + dy * dy) or 1
-                            boss.apply_knockback(dx/dist * 5, dy/dist * 5)  # Reduced from 20 to 5
-                            if boss.health <= 0:
-                                boss = None
-                                score += 1000
-                                boss_hit = True
-                            shrek.punch_cooldown = 20
-                        # Then check minions
-                        if not boss_hit:  # Only add score for one type of hit
-                            score += shrek.punch(enemies)
-                    else:  # No boss, just minions
-                        score += shrek.punch(enemies)
-                if keys[pygame.K_r] and shrek.kick_cooldown <= 0:
-                    # Play kick sound
-                    if 'KICK_SOUND' in globals() and KICK_SOUND:
-                        KICK_SOUND.play()
-                    if boss:
-                        # First check boss
-                        boss_hit = False
-                        if abs(boss.x - shrek.x) < 150 and abs(boss.y - shrek.y) < 100:
-                            boss.health -= 20
-                            boss.hit_flash = 10
-                            dx = boss.x - shrek.x
-                            dy = boss.y - shrek.y
-                            dist = math.sqrt(dx * dx + dy * dy) or 1
-                            boss.apply_knockback(dx/dist * 6, dy/dist * 6)  # Reduced from 25 to 6
-                            if boss.health <= 0:
-                                boss = None
-                                score += 1000
-                                boss_hit = True
-                        # Then check minions
-                        if not boss_hit:  # Only add score for one type of hit
-                            score += shrek.kick(enemies)
+                        new_enemy = SkibidiToilet()
+                elif current_wave >= 3:  # Waves 3-6
+                    if enemy_roll < 0.2:  # Reduced from 0.3 to 0.2
+                        new_enemy = GunnerSkibidi()
+                    elif enemy_roll < 0.6:
+                        new_enemy = FastSkibidi()
                     else:
-                        score += shrek.kick(enemies)
-                if keys[pygame.K_e] and shrek.fart_cooldown <= 0:
-                    # Play fart sound
-                    if 'FART_SOUND' in globals() and FART_SOUND:
-                        FART_SOUND.play()
-                    fart_clouds.append(FartCloud(shrek.x + shrek.width/2, shrek.y + shrek.height/2))
-                    shrek.fart_cooldown = 45  # Reduced from 60 to 45
-
-            # Spawn enemies for normal waves
-            if current_wave != 5 and current_wave != 10 and wave_enemies_remaining > 0:
-                enemy_spawn_timer += 1
-                # Calculate spawn interval based on wave number (gets shorter in later waves)
-                spawn_interval = max(30, 120 - (current_wave * 10))  # Starts at 120, decreases by 10 each wave, minimum 30
-                if enemy_spawn_timer >= spawn_interval:
-                    # Choose enemy type based on wave and random chance
-                    enemy_roll = random.random()
-                    if current_wave >= 7:  # More gunners in later waves
-                        if enemy_roll < 0.25 and current_wave >= 3:  # Reduced from 0.4 to 0.25
-                            new_enemy = GunnerSkibidi()
-                        elif enemy_roll < 0.7:  # Increased fast toilet chance
-                            new_enemy = FastSkibidi()
-                        else:
-                            new_enemy = SkibidiToilet()
-                    elif current_wave >= 3:  # Waves 3-6
-                        if enemy_roll < 0.2:  # Reduced from 0.3 to 0.2
-                            new_enemy = GunnerSkibidi()
-                        elif enemy_roll < 0.6:
-                            new_enemy = FastSkibidi()
-                        else:
-                            new_enemy = SkibidiToilet()
-                    else:  # Waves 1-2: no gunners
-                        if enemy_roll < 0.6:
-                            new_enemy = FastSkibidi()
+                        new_enemy = SkibidiToilet()
+                else:  # Waves 1-2: no gunners
+                    if enemy_roll < 0.6:
+                        new_enemy = FastSkibidi()
+                    else:
+                        new_enemy = SkibidiToilet()
+                
+                # Spawn multiple enemies at once in later waves
+                enemies_per_spawn = min(3, 1 + current_wave // 4)  # Spawn more enemies at once in later waves
+                for _ in range(enemies_per_spawn):
+                    if self.wave_enemies_remaining > 0:
+                        # Adjust enemy type probabilities for multiple spawns as well
+                        enemy_roll = RNG.spawn.random()  # New roll for each spawn
+                        if current_wave >= 7 and current_wave >= 3:
+                            new_enemy = (GunnerSkibidi() if enemy_roll < 0.25 else 
+                                      (FastSkibidi() if enemy_roll < 0.7 else SkibidiToilet()))
+                        elif current_wave >= 3:
+                            new_enemy = (GunnerSkibidi() if enemy_roll < 0.2 else 
+                                      (FastSkibidi() if enemy_roll < 0.6 else SkibidiToilet()))
                         else:
-                            new_enemy = SkibidiToilet()
-                    
-                    # Spawn multiple enemies at once in later waves
-                    enemies_per_spawn = min(3, 1 + current_wave // 4)  # Spawn more enemies at once in later waves
-                    for _ in range(enemies_per_spawn):
-                        if wave_enemies_remaining > 0:
-                            # Adjust enemy type probabilities for multiple spawns as well
-                            enemy_roll = random.random()  # New roll for each spawn
-                            if current_wave >= 7 and current_wave >= 3:
-                                new_enemy = (GunnerSkibidi() if enemy_roll < 0.25 else 
-                                          (FastSkibidi() if enemy_roll < 0.7 else SkibidiToilet()))
-                            elif current_wave >= 3:
-                                new_enemy = (GunnerSkibidi() if enemy_roll < 0.2 else 
-                                          (FastSkibidi() if enemy_roll < 0.6 else SkibidiToilet()))
-                            else:
-                                new_enemy = FastSkibidi() if enemy_roll < 0.6 else SkibidiToilet()
-                            new_enemy.target_player = shrek
-                            enemies.append(new_enemy)
-                            wave_enemies_remaining -= 1
-                    
-                    enemy_spawn_timer = 0
-
-            # Update enemies
-            for enemy in enemies[:]:
+                            new_enemy = FastSkibidi() if enemy_roll < 0.6 else SkibidiToilet()
+                        new_enemy.target_player = shrek
+                        self.enemies.append(new_enemy)
+                        self.wave_enemies_remaining -= 1
+                
+                self.enemy_spawn_timer = 0
+
+    def update_enemies(self):
+        shrek = self.shrek
+        enemies = self.enemies
+
+        # Update enemies, batched once the swarm is big enough
+        if len(enemies) >= VECTORIZED_MOVE_THRESHOLD:
+            self.enemy_store.move_all(enemies)
+        else:
+            for enemy in enemies:
                 enemy.move()
-                # Check if enemy has gone off screen on any side
-                if (enemy.x < -enemy.width or 
-                    enemy.x > WINDOW_WIDTH or 
-                    enemy.y < -enemy.height or 
-                    enemy.y > WINDOW_HEIGHT):
-                    enemies.remove(enemy)
-                    shrek.health -= 30  # Increased from 20 to 30 damage for missing an enemy
-                    # Knockback player when taking damage from missed enemy
-                    dx = shrek.x - enemy.x
-                    dy = shrek.y - enemy.y
-                    dist = math.sqrt(dx * dx + dy * dy) or 1
-                    shrek.apply_knockback(dx/dist * 8, dy/dist * 8)
-
-                # Collision with Shrek (only if not riding Donkey)
-                if not shrek.donkey and (abs(enemy.x - shrek.x) < 40 and 
-                    abs(enemy.y - shrek.y) < 40):
-                    shrek.health -= 5  # Increased from 3 to 5 damage per collision
-                    # Knockback both player and enemy
-                    dx = shrek.x - enemy.x
-                    dy = shrek.y - enemy.y
-                    dist = math.sqrt(dx * dx + dy * dy) or 1
-                    knockback_force = 12
-                    shrek.apply_knockback(dx/dist * knockback_force, dy/dist * knockback_force)
-                    enemy.apply_knockback(-dx/dist * knockback_force * 0.8, -dy/dist * knockback_force * 0.8)
-
-            # Update boss
-            if boss:
-                actions = boss.update(shrek)
-                for action in actions:
-                    if action == 'spawn_minions':
-                        for _ in range(2):
-                            minion = SkibidiToilet()
-                            minion.x = boss.x
-                            minion.y = boss.y
-                            minion.target_player = shrek
-                            enemies.append(minion)
-                    elif action == 'projectile':
-                        # Add projectile logic here if desired
-                        pass
-
-                # Check boss collision with Shrek (only if not riding Donkey)
-                if not shrek.donkey and (abs(boss.x - shrek.x) < 60 and 
-                    abs(boss.y - shrek.y) < 60):
-                    shrek.health -= 8  # Increased from 5 to 8 damage for boss collision
-                    # Knockback both player and boss
-                    dx = shrek.x - boss.x
-                    dy = shrek.y - boss.y
-                    dist = math.sqrt(dx * dx + dy * dy) or 1
+        for enemy in enemies[:]:
+            # Check if enemy has gone off screen on any side
+            if (enemy.x < -enemy.width or 
+                enemy.x > WINDOW_WIDTH or 
+                enemy.y < -enemy.height or 
+                enemy.y > WINDOW_HEIGHT):
+                enemies.remove(enemy)
+                shrek.health -= 30  # Increased from 20 to 30 damage for missing an enemy
+                # Knockback player when taking damage from missed enemy
+                dx = shrek.x - enemy.x
+                dy = shrek.y - enemy.y
+                dist = math.sqrt(dx * dx + dy * dy) or 1
+                shrek.apply_knockback(dx/dist * 8, dy/dist * 8)
+
+            # Collision with Shrek (only if not riding Donkey)
+            if not shrek.donkey and (abs(enemy.x - shrek.x) < 40 and 
+                abs(enemy.y - shrek.y) < 40):
+                shrek.health -= 5  # Increased from 3 to 5 damage per collision
+                # Knockback both player and enemy
+                dx = shrek.x - enemy.x
+                dy = shrek.y - enemy.y
+                dist = math.sqrt(dx * dx + dy * dy) or 1
+                knockback_force = 12
+                shrek.apply_knockback(dx/dist * knockback_force, dy/dist * knockback_force)
+                enemy.apply_knockback(-dx/dist * knockback_force * 0.8, -dy/dist * knockback_force * 0.8)
+
+    def update_boss(self):
+        shrek = self.shrek
+        boss = self.boss
+        if boss:
+            actions = boss.update(shrek)
+            for action in actions:
+                if action == 'spawn_minions':
+                    for _ in range(2):
+                        minion = SkibidiToilet()
+                        minion.x = boss.x
+                        minion.y = boss.y
+                        minion.target_player = shrek
+                        self.enemies.append(minion)
+                elif action == 'projectile':
+                    boss.fire_projectiles(shrek)
+
+            # Check boss collision with Shrek (only if not riding Donkey)
+            if not shrek.donkey and (abs(boss.x - shrek.x) < 60 and 
+                abs(boss.y - shrek.y) < 60):
+                shrek.health -= 8  # Increased from 5 to 8 damage for boss collision
+                # Knockback both player and boss
+                dx = shrek.x - boss.x
+                dy = shrek.y - boss.y
+                dist = math.sqrt(dx * dx + dy * dy) or 1
+                knockback_force = 15
+                shrek.apply_knockback(dx/dist * knockback_force, dy/dist * knockback_force)
+                boss.apply_knockback(-dx/dist * knockback_force * 0.5, -dy/dist * knockback_force * 0.5)
+
+        # Update projectiles from gunners and bosses
+        PROJECTILE_POOL.update(shrek)
+
+        # Make sure the portal finishes closing if it's still around
+        if self.portal:
+            self.portal.update()
+
+    def update_fart_clouds(self):
+        for cloud in self.fart_clouds[:]:
+            cloud.update()
+            if cloud.lifetime <= 0:
+                self.fart_clouds.remove(cloud)
+        if not self.fart_clouds:
+            return
+        grid = self.grid
+        self.rebuild_collision_grid()  # Enemies have moved and clouds have grown
+
+        # Check boss damage from fart
+        boss = self.boss
+        if boss:
+            center_x = boss.x + boss.width/2
+            center_y = boss.y + boss.height/2
+            for cloud in grid.query_rect('clouds', boss.x, boss.y, boss.width, boss.height):
+                dx = center_x - cloud.x
+                dy = center_y - cloud.y
+                distance_sq = dx*dx + dy*dy
+                if distance_sq < cloud.radius * cloud.radius:
+                    distance = math.sqrt(distance_sq) or 1
+                    boss.health -= 1
+                    boss.hit_flash = 10
                     knockback_force = 15
-                    shrek.apply_knockback(dx/dist * knockback_force, dy/dist * knockback_force)
-                    boss.apply_knockback(-dx/dist * knockback_force * 0.5, -dy/dist * knockback_force * 0.5)
-
-            # Update fart clouds
-            for cloud in fart_clouds[:]:
-                cloud.update()
-                if cloud.lifetime <= 0:
-                    fart_clouds.remove(cloud)
-                else:
-                    # Check boss damage from fart and block missiles
-                    if boss:
-                        # Check boss missiles
-                        if isinstance(boss, SuperSkibidiBoss):
-                            for missile in boss.missiles[:]:
-                                dx = missile['x'] - cloud.x
-                                dy = missile['y'] - cloud.y
-                                distance = math.sqrt(dx*dx + dy*dy)
-                                if distance < cloud.radius:
-                                    boss.missiles.remove(missile)  # Destroy missile
-                                    continue
-
-                        # Normal boss damage
-                        dx = boss.x + boss.width/2 - cloud.x
-                        dy = boss.y + boss.height/2 - cloud.y
-                        distance = math.sqrt(dx*dx + dy*dy)
-                        if distance < cloud.radius:
-                            boss.health -= 1
-                            boss.hit_flash = 10
-                            knockback_force = 15
-                            boss.apply_knockback(dx/distance * knockback_force * 0.2, dy/distance * knockback_force * 0.2)
-                            if boss.health <= 0:
-                                boss = None
-                                score += 1000
-                    
-                    # Check minion damage from fart and block projectiles
-                    for enemy in enemies[:]:
-                        # Check gunner projectiles
-                        if isinstance(enemy, GunnerSkibidi):
-                            for proj in enemy.projectiles[:]:
-                                dx = proj['x'] - cloud.x
-                                dy = proj['y'] - cloud.y
-                                distance = math.sqrt(dx*dx + dy*dy)
-                                if distance < cloud.radius:
-                                    enemy.projectiles.remove(proj)  # Destroy projectile
-                                    continue
-
-                        # Normal enemy damage
-                        dx = enemy.x + enemy.width/2 - cloud.x
-                        dy = enemy.y + enemy.height/2 - cloud.y
-                        distance = math.sqrt(dx*dx + dy*dy)
-                        if distance < cloud.radius:
-                            enemy.health -= 1
-                            enemy.hit_flash = 10
-                            knockback_force = 15
-                            enemy.apply_knockback(dx/distance * knockback_force * 0.2, dy/distance * knockback_force * 0.2)
-                            if enemy.health <= 0:
-                                enemies.remove(enemy)
-                                score += 100
-
-            # Check wave completion and victory
-            if current_wave < 10 and wave_enemies_remaining == 0 and len(enemies) == 0:
-                if current_wave == 5:
-                    if not boss:  # First boss defeated
-                        current_wave += 1
-                        score += 1000  # First boss defeat bonus
-                        game_state = WAVE_ANNOUNCEMENT
-                        start_wave(current_wave)
-                elif current_wave != 5:
-                    current_wave += 1
-                    game_state = WAVE_ANNOUNCEMENT
-                    start_wave(current_wave)
-            elif current_wave == 10:  # Final boss wave
-                if boss and boss.health <= 0:  # Boss just defeated
-                    boss = None
-                    score += 2000  # Super boss defeat bonus
-                elif not boss and len(enemies) == 0:  # Boss is dead and all enemies cleared
-                    game_state = VICTORY
-                    victory_timer = 0
-                    victory_stage = 0
-                    # Initialize victory animation
-                    shrek.victory_x = shrek.x
-                    shrek.victory_y = shrek.y
+                    boss.apply_knockback(dx/distance * knockback_force * 0.2, dy/distance * knockback_force * 0.2)
+                    if boss.health <= 0:
+                        grid.remove(boss)
+                        self.boss = None
+                        self.score += 1000
+                        break
+
+        # Check minion damage from fart, only for toilets sharing a cell with a cloud
+        for enemy in self.enemies[:]:
+            for cloud in grid.query_rect('clouds', enemy.x, enemy.y, enemy.width, enemy.height):
+                dx = enemy.x + enemy.width/2 - cloud.x
+                dy = enemy.y + enemy.height/2 - cloud.y
+                distance_sq = dx*dx + dy*dy
+                if distance_sq < cloud.radius * cloud.radius:
+                    distance = math.sqrt(distance_sq) or 1
+                    enemy.health -= 1
+                    enemy.hit_flash = 10
+                    knockback_force = 15
+                    enemy.apply_knockback(dx/distance * knockback_force * 0.2, dy/distance * knockback_force * 0.2)
+                    if enemy.health <= 0:
+                        self.enemies.remove(enemy)
+                        grid.remove(enemy)
+                        self.score += 100
+                        break
+
+        # Fart clouds block projectiles
+        PROJECTILE_POOL.collide_clouds(self.fart_clouds)
+
+    def check_wave_progress(self):
+        # Check wave completion and victory
+        if self.current_wave < 10 and self.wave_enemies_remaining == 0 and len(self.enemies) == 0:
+            if self.current_wave == 5:
+                if not self.boss:  # First boss defeated
+                    self.current_wave += 1
+                    self.score += 1000  # First boss defeat bonus
+                    self.game_state = WAVE_ANNOUNCEMENT
+                    self.start_wave(self.current_wave)
+            elif self.current_wave != 5:
+                self.current_wave += 1
+                self.game_state = WAVE_ANNOUNCEMENT
+                self.start_wave(self.current_wave)
+        elif self.current_wave == 10:  # Final boss wave
+            if self.boss and self.boss.health <= 0:  # Boss just defeated
+                self.boss = None
+                self.score += 2000  # Super boss defeat bonus
+            elif not self.boss and len(self.enemies) == 0:  # Boss is dead and all enemies cleared
+                self.game_state = VICTORY
+                self.victory_timer = 0
+                self.victory_stage = 0
+                # Initialize victory animation
+                self.shrek.victory_x = self.shrek.x
+                self.shrek.victory_y = self.shrek.y
+
+        if self.shrek.health <= 0:
+            self.game_state = GAME_OVER
+
+    def update_victory(self):
+        if self.victory_stage == 0:
+            # Show the initial message for 3 seconds
+            self.victory_timer += 1
+            if self.victory_timer > 180:
+                self.victory_stage = 1
+                self.victory_timer = 0
+
+        elif self.victory_stage == 1:
+            # Move Shrek towards home
+            if self.shrek.move_towards_home():
+                self.victory_stage = 2
+                self.victory_timer = 0
+
+# Debug panel with FPS, a frame-time graph, entity counts and phase timings (F3)
+class PerfOverlay:
+    WIDTH = 250
+    HEIGHT = 290
+    GRAPH_HEIGHT = 60
+    GRAPH_SCALE_MS = 40  # Frame time at the top of the graph
 
-            # Draw everything
-            shrek.draw(screen)
-            for enemy in enemies:
-                enemy.draw(screen)
-            if boss:
-                boss.draw(screen)
-            if portal:  # Make sure portal is always drawn if it exists
-                portal.update()
-                portal.draw(screen)
-            for cloud in fart_clouds:
-                cloud.draw(screen)
-            for onion in onions:  # Draw onions
-                onion.draw(screen)
-
-            # Draw wave number and score below health and donkey meter
-            wave_text = font.render(f"Wave {current_wave}", True, WHITE)
-            if current_wave == 5:
-                boss_text = font.render("BOSS FIGHT", True, RED)
-                screen.blit(wave_text, (10, 70))
-                screen.blit(boss_text, (10, 100))  # Display boss text below wave number
-                score_text = f"Score: {score}"
-                shadow = font.render(score_text, True, BLACK)
-                text = font.render(score_text, True, WHITE)
-                screen.blit(shadow, (12, 122))     # Moved score down to accommodate boss text
-                screen.blit(text, (10, 120))
+    def __init__(self):
+        self.font = get_font(20)
+        self.x = WINDOW_WIDTH - self.WIDTH - 10
+        self.y = 70  # Below the pause button
+        self.panel = pygame.Surface((self.WIDTH, self.HEIGHT), pygame.SRCALPHA)
+        self.panel.fill((0, 0, 0, 170))
+        self.lines = []
+        self.refresh_timer = 0
+        # Timings change on every refresh, so keep them out of the shared TEXT_CACHE
+        # where they would push out the HUD's strings; the count lines still repeat
+        self.text_cache = TextCache(max_size=32)
+
+    def refresh(self, game, stats):
+        particles = len(game.portal.particles) if game.portal else 0
+        text = [
+            f"FPS {stats.fps():5.1f}   frame {stats.frame_times[-1] if stats.frame_times else 0:5.1f} ms",
+            f"enemies {len(game.enemies)}  projectiles {PROJECTILE_POOL.count}",
+            f"particles {particles}  clouds {len(game.fart_clouds)}  onions {len(game.onions)}",
+        ]
+        text += [f"{phase:<12} {stats.phase_ms[phase]:6.2f} ms" for phase in PERF_PHASES]
+        self.lines = [self.text_cache.render(self.font, line, WHITE) for line in text]
+
+    def draw(self, screen, game, stats):
+        # Re-render the text a few times a second instead of every frame
+        if self.refresh_timer <= 0:
+            self.refresh(game, stats)
+            self.refresh_timer = 15
+        self.refresh_timer -= 1
+
+        rect = screen.blit(self.panel, (self.x, self.y))
+
+        # Frame-time graph, with a line at the 60 FPS budget
+        graph_bottom = self.y + 5 + self.GRAPH_HEIGHT
+        budget_y = graph_bottom - self.GRAPH_HEIGHT * (1000 / FPS) / self.GRAPH_SCALE_MS
+        pygame.draw.line(screen, (90, 90, 90), (self.x + 5, budget_y), (self.x + self.WIDTH - 5, budget_y))
+        if len(stats.frame_times) > 1:
+            step = (self.WIDTH - 10) / (PERF_HISTORY - 1)
+            points = [(self.x + 5 + i * step,
+                       graph_bottom - self.GRAPH_HEIGHT * min(ms, self.GRAPH_SCALE_MS) / self.GRAPH_SCALE_MS)
+                      for i, ms in enumerate(stats.frame_times)]
+            pygame.draw.lines(screen, GREEN, False, points)
+
+        y = graph_bottom + 8
+        for line in self.lines:
+            screen.blit(line, (self.x + 8, y))
+            y += 18
+        return rect
+
+# Past this share of the screen changing, one full flip beats many small updates
+DIRTY_FULL_FLIP_RATIO = 0.5
+DIRTY_COVERAGE_CELL = 16  # Resolution of the changed-area estimate
+
+# Redraws and pushes only the parts of the screen that changed: last frame's
+# rects are restored from the background, and last frame's plus this frame's
+# rects are sent to the display
+class DirtyRectRenderer:
+    def __init__(self):
+        self.screen_rect = pygame.Rect(0, 0, WINDOW_WIDTH, WINDOW_HEIGHT)
+        self.coverage = np.zeros((-(-WINDOW_HEIGHT // DIRTY_COVERAGE_CELL), -(-WINDOW_WIDTH // DIRTY_COVERAGE_CELL)), dtype=bool)
+        self.previous = []
+        self.background = None
+        self.full_redraw = True
+
+    def invalidate(self):
+        self.full_redraw = True
+
+    def restore(self, screen, background):
+        if background is not self.background:
+            self.background = background
+            self.full_redraw = True
+        if self.full_redraw:
+            screen.blit(background, (0, 0))
+        else:
+            for rect in self.previous:
+                screen.blit(background, rect, rect)
+
+    def present(self, rects):
+        current = [rect.clip(self.screen_rect) for rect in rects]
+        current = [rect for rect in current if rect.width and rect.height]
+        changed = self.previous + current
+        if self.full_redraw or self.changed_fraction(changed) > DIRTY_FULL_FLIP_RATIO:
+            pygame.display.flip()
+        else:
+            pygame.display.update(changed)
+        self.previous = current
+        self.full_redraw = False
+
+    def changed_fraction(self, rects):
+        # Share of the screen the rects cover, on a coarse grid so overlaps count once
+        cell = DIRTY_COVERAGE_CELL
+        coverage = self.coverage
+        coverage.fill(False)
+        for rect in rects:
+            coverage[rect.top // cell:-(-rect.bottom // cell), rect.left // cell:-(-rect.right // cell)] = True
+        return coverage.mean()
+
+# One piece of the HUD. Like OutlinedText, it keeps what it last rendered and
+# only renders again when the value it shows changes; drawing is then just
+# blitting the cached parts.
+class HudWidget:
+    def __init__(self, render):
+        self.render = render  # value -> list of (surface, position)
+        self.value = None
+        self.parts = None
+
+    def draw(self, screen, value):
+        if self.parts is None or value != self.value:
+            self.value = value
+            self.parts = self.render(value)
+        return bounding_rect(*[screen.blit(surface, position) for surface, position in self.parts])
+
+# Retained-mode HUD: health, Donkey meter, wave and score, controls, pause button and boss bar
+class Hud:
+    def __init__(self, font, pause_button, hover_button, pause_button_rect):
+        self.font = font
+        self.pause_button = pause_button
+        self.hover_button = hover_button
+        self.pause_button_rect = pause_button_rect
+        self.health = HudWidget(self.render_health)
+        self.donkey_meter = HudWidget(self.render_donkey_meter)
+        self.score = HudWidget(self.render_score)
+        self.controls = HudWidget(self.render_controls)
+        self.pause = HudWidget(self.render_pause)
+        self.boss_bar = HudWidget(self.render_boss_bar)
+
+    def draw(self, screen, game):
+        # Returns the rects drawn
+        rects = self.draw_player(screen, game.shrek)
+        if game.boss:
+            rects.append(self.draw_boss(screen, game.boss))
+        rects.append(self.score.draw(screen, (game.current_wave, game.score)))
+        rects.append(self.controls.draw(screen, None))
+        # Lighter pause button when hovering
+        rects.append(self.pause.draw(screen, self.pause_button_rect.collidepoint(pygame.mouse.get_pos())))
+        return rects
+
+    def draw_player(self, screen, shrek):
+        rects = [self.health.draw(screen, shrek.health)]
+        if not shrek.donkey:
+            full = shrek.donkey_charge >= shrek.max_donkey_charge
+            flash = full and shrek.donkey_ready_flash // 15 % 2 == 0
+            rects.append(self.donkey_meter.draw(screen, (shrek.donkey_charge, shrek.max_donkey_charge, flash)))
+        return rects
+
+    def draw_boss(self, screen, boss):
+        return self.boss_bar.draw(screen, (boss.name, boss.health, boss.max_health))
+
+    def render_health(self, health):
+        # Draw health bar with border and background
+        bar = pygame.Surface((164, 24))  # 80 health * 2 + 4 for border
+        bar.fill(BLACK)
+        pygame.draw.rect(bar, (60, 60, 60), (2, 2, 160, 20))
+        pygame.draw.rect(bar, GREEN, (2, 2, health * 2, 20))  # Keep multiplier at 2 to maintain same visual size
+        return [(bar, (8, 8))]
+
+    def render_donkey_meter(self, value):
+        charge, max_charge, flash = value
+        charge_width = 100
+        charge_height = 20
+        # Draw meter background and border
+        meter = pygame.Surface((charge_width + 4, charge_height + 4))
+        meter.fill(BLACK)
+        pygame.draw.rect(meter, (60, 60, 60), (2, 2, charge_width, charge_height))
+        parts = [(meter, (8, 38))]
+
+        # Draw charge amount
+        charge_amount = (charge / max_charge) * charge_width
+        if charge_amount > 0:
+            if charge >= max_charge:
+                # Flash effect when fully charged
+                pygame.draw.rect(meter, (200, 150, 50) if flash else BROWN, (2, 2, charge_width, charge_height))
+                # Draw "READY!" text and button prompt
+                parts.append((render_text(get_font(20), "READY! (SPACE)", WHITE), (12, 42)))
             else:
-                screen.blit(wave_text, (10, 70))
-                score_text = f"Score: {score}"
-                shadow = font.render(score_text, True, BLACK)
-                text = font.render(score_text, True, WHITE)
-                screen.blit(shadow, (12, 92))
-                screen.blit(text, (10, 90))
-
-            # Draw controls help (update text to show Q instead of Left Click)
-            controls_text = font.render("Q: Punch  R: Kick  E: Fart", True, WHITE)
-            screen.blit(controls_text, (10, WINDOW_HEIGHT - 30))
-
-            # Draw pause button in top right corner
-            if game_state != PAUSED:
-                # Draw button background with hover effect
-                mouse_pos = pygame.mouse.get_pos()
-                if pause_button_rect.collidepoint(mouse_pos):
-                    # Lighter color when hovering
-                    hover_button = pause_button.copy()
-                    hover_button.fill((80, 80, 80))
-                    pygame.draw.rect(hover_button, WHITE, (12, 8, 6, 24))
-                    pygame.draw.rect(hover_button, WHITE, (24, 8, 6, 24))
-                    screen.blit(hover_button, (WINDOW_WIDTH - 50, 10))
-                else:
-                    screen.blit(pause_button, (WINDOW_WIDTH - 50, 10))
-                # Draw button label
-                pause_label = font.render("P", True, WHITE)
-                screen.blit(pause_label, (WINDOW_WIDTH - 35, 45))
-
-            if shrek.health <= 0:
-                game_state = GAME_OVER
-
-        elif game_state == GAME_OVER:
-            game_over_text = font.render(f"Game Over! Final Score: {score}", True, WHITE)
-            restart_text = font.render("Press SPACE to Restart", True, WHITE)
-            screen.blit(game_over_text, (WINDOW_WIDTH//2 - game_over_text.get_width()//2, WINDOW_HEIGHT//2))
-            screen.blit(restart_text, (WINDOW_WIDTH//2 - restart_text.get_width()//2, WINDOW_HEIGHT//2 + 50))
-
-        elif game_state == PAUSED:
-            # Draw the game state as it was
-            shrek.draw(screen)
-            for enemy in enemies:
-                enemy.draw(screen)
-            if boss:
-                boss.draw(screen)
-            for cloud in fart_clouds:
-                cloud.draw(screen)
+                pygame.draw.rect(meter, BROWN, (2, 2, charge_amount, charge_height))
+        return parts
+
+    def render_score(self, value):
+        # Draw wave number and score below health and donkey meter
+        wave, score = value
+        font = self.font
+        score_text = f"Score: {score}"
+        parts = [(render_text(font, f"Wave {wave}", WHITE), (10, 70))]
+        if wave == 5:
+            parts.append((render_text(font, "BOSS FIGHT", RED), (10, 100)))  # Display boss text below wave number
+            parts.append((render_text(font, score_text, BLACK), (12, 122)))  # Moved score down to accommodate boss text
+            parts.append((render_text(font, score_text, WHITE), (10, 120)))
+        else:
+            parts.append((render_text(font, score_text, BLACK), (12, 92)))
+            parts.append((render_text(font, score_text, WHITE), (10, 90)))
+        return parts
+
+    def render_controls(self, value):
+        # Draw controls help (update text to show Q instead of Left Click)
+        return [(render_text(self.font, "Q: Punch  R: Kick  E: Fart", WHITE), (10, WINDOW_HEIGHT - 30))]
+
+    def render_pause(self, hovering):
+        # Draw pause button in top right corner, then its label
+        return [(self.hover_button if hovering else self.pause_button, self.pause_button_rect.topleft),
+                (render_text(self.font, "P", WHITE), (WINDOW_WIDTH - 35, 45))]
+
+    def render_boss_bar(self, value):
+        # Draw boss health bar at the bottom of the screen
+        name, health, max_health = value
+        bar_width = 400
+        bar_height = 20
+        health_percent = health / max_health
+
+        # Draw boss name above health bar, with shadow effect
+        name_font = get_font(48)  # Larger font for boss name
+        name_text = render_text(name_font, name, WHITE)
+        name_shadow = render_text(name_font, name, BLACK)
+        name_x = WINDOW_WIDTH//2 - name_text.get_width()//2
+
+        bar = pygame.Surface((bar_width + 4, bar_height + 4))
+        bar.fill(BLACK)
+        pygame.draw.rect(bar, RED, (2, 2, bar_width, bar_height))
+        pygame.draw.rect(bar, GREEN, (2, 2, int(bar_width * health_percent), bar_height))
+        return [(name_shadow, (name_x + 2, WINDOW_HEIGHT - 62)), (name_text, (name_x, WINDOW_HEIGHT - 64)),
+                (bar, (WINDOW_WIDTH//2 - bar_width//2 - 2, WINDOW_HEIGHT - 32))]
+
+# Draws a Game to the screen; owns fonts and pre-rendered UI surfaces
+class GameView:
+    def __init__(self, dirty_rects=False):
+        self.font = get_font(36)
+        self.renderer = DirtyRectRenderer() if dirty_rects else None
+        self.dirty = []
+
+        # Create pause overlay, and the surface the paused scene is frozen into
+        self.pause_overlay = ScreenOverlay(BLACK)
+        self.pause_frame = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT))
+        self.pause_frozen = False
+
+        # Create fonts
+        title_font = get_font(72, "freesansbold.ttf")  # Larger size for title
+        menu_font = get_font(36, "freesansbold.ttf")   # Regular size for menu items
+
+        # Create pause button surface and rect for click detection
+        self.pause_button = pygame.Surface((40, 40))
+        self.pause_button.fill((60, 60, 60))
+        pygame.draw.rect(self.pause_button, WHITE, (12, 8, 6, 24))
+        pygame.draw.rect(self.pause_button, WHITE, (24, 8, 6, 24))
+        # Lighter color when hovering
+        self.hover_button = pygame.Surface((40, 40))
+        self.hover_button.fill((80, 80, 80))
+        pygame.draw.rect(self.hover_button, WHITE, (12, 8, 6, 24))
+        pygame.draw.rect(self.hover_button, WHITE, (24, 8, 6, 24))
+        self.pause_button_rect = pygame.Rect(WINDOW_WIDTH - 50, 10, 40, 40)
+        self.hud = Hud(self.font, self.pause_button, self.hover_button, self.pause_button_rect)
+        self.perf_overlay = PerfOverlay()
+
+        # Pre-bake outlined and shadowed text
+        self.title_lines = [
+            (OutlinedText(title_font, "Skibidi Shrek", TITLE_OUTLINE_OFFSETS), WINDOW_HEIGHT//4),
+            (OutlinedText(title_font, "Swamp Showdown", TITLE_OUTLINE_OFFSETS), WINDOW_HEIGHT//4 + 80),
+            (OutlinedText(menu_font, "Press SPACE to Start", TITLE_OUTLINE_OFFSETS), WINDOW_HEIGHT//2 + 50),
+            (OutlinedText(menu_font, "Movement: WASD or Arrow Keys", TITLE_OUTLINE_OFFSETS), WINDOW_HEIGHT//2 + 100),
+            (OutlinedText(menu_font, "SPACE: Summon Donkey when Meter Full", TITLE_OUTLINE_OFFSETS), WINDOW_HEIGHT//2 + 140),
+            (OutlinedText(menu_font, "Q: Punch  R: Kick  E: Fart  P: Pause", TITLE_OUTLINE_OFFSETS), WINDOW_HEIGHT//2 + 180)
+        ]
+        self.wave_banner = OutlinedText(get_font(96), "Wave 1", WAVE_OUTLINE_OFFSETS)  # Larger font for wave announcement
+        self.final_banner = OutlinedText(self.font, "Back in my swamp!", DROP_SHADOW_OFFSETS)
+        self.play_again_banner = OutlinedText(self.font, "Press SPACE to Play Again", DROP_SHADOW_OFFSETS)
+
+    def draw(self, screen, game, alpha=1.0):
+        # Returns the rects drawn this frame
+        self.dirty = []
+        # Draw entities part-way between their last two simulated positions
+        moved = self.interpolate_positions(game, alpha) if alpha < 1.0 else []
+        self.draw_scene(screen, game, alpha)
+        for entity, x, y in moved:
+            entity.x = x
+            entity.y = y
+        if PERF.enabled:
+            self.mark(self.perf_overlay.draw(screen, game, PERF))
+        return self.dirty
+
+    def draw_loading(self, screen, loader):
+        # Title screen with a progress bar in place of the menu until the game can start
+        screen.blit(BACKGROUND, (0, 0))
+        for title_line, y in self.title_lines[:2]:
+            title_line.draw_centered(screen, WINDOW_WIDTH//2, y)
+        bar = pygame.Rect(WINDOW_WIDTH//4, WINDOW_HEIGHT//2 + 50, WINDOW_WIDTH//2, 24)
+        pygame.draw.rect(screen, BLACK, bar)
+        fill = bar.inflate(-4, -4)
+        fill.width = int(fill.width * loader.progress)
+        pygame.draw.rect(screen, GREEN, fill)
+        pygame.draw.rect(screen, WHITE, bar, 2)
+
+    def mark(self, drawn):
+        # Record what a draw call touched: a Rect, a list of Rects, or None
+        if drawn is None:
+            return
+        if isinstance(drawn, list):
+            self.dirty.extend(rect for rect in drawn if rect)
+        else:
+            self.dirty.append(drawn)
+
+    def present(self):
+        if self.renderer:
+            self.renderer.present(self.dirty)
+        else:
+            pygame.display.flip()
+
+    def interpolate_positions(self, game, alpha):
+        moved = []
+        for entity in game.moving_entities():
+            if entity.prev_x is not None:
+                moved.append((entity, entity.x, entity.y))
+                entity.x = entity.prev_x + (entity.x - entity.prev_x) * alpha
+                entity.y = entity.prev_y + (entity.y - entity.prev_y) * alpha
+        return moved
+
+    def draw_scene(self, screen, game, alpha):
+        font = self.font
+        shrek = game.shrek
+        mark = self.mark
+
+        # Draw swamp background for victory scene, the jungle otherwise
+        background = SWAMP_BACKGROUND if game.game_state == VICTORY and SWAMP_BACKGROUND else BACKGROUND
+        if game.game_state != PAUSED:
+            self.pause_frozen = False
+        elif self.pause_frozen:
+            # Nothing moves while paused: the frozen scene is the whole frame
+            background = self.pause_frame
+        if self.renderer:
+            self.renderer.restore(screen, background)
+        else:
+            screen.blit(background, (0, 0))
+
+        if game.game_state == TITLE_SCREEN:
+            # Draw all menu text with outlines, centered
+            for title_line, y in self.title_lines:
+                mark(title_line.draw_centered(screen, WINDOW_WIDTH//2, y))
+        
+        elif game.game_state == WAVE_ANNOUNCEMENT:
+            # Show wave announcement with larger outlined text
+            self.wave_banner.set_text(f"Wave {game.current_wave}")
+            mark(self.wave_banner.draw(screen,
+                                       WINDOW_WIDTH//2 - self.wave_banner.width//2,
+                                       WINDOW_HEIGHT//2 - self.wave_banner.height//2))
+
+        elif game.game_state == BOSS_INTRO:
+            if game.portal:
+                mark(game.portal.draw(screen))
+            if game.boss:
+                mark(game.boss.draw(screen))
+                mark(self.hud.draw_boss(screen, game.boss))
+
+        elif game.game_state == PLAYING:
+            # Healing number popups
+            for amount, color, x, y, lifetime in game.heal_popups:
+                mark(screen.blit(render_text(font, f"+{amount}", color), (x, y)))
+
+            for anim in shrek.attack_animations:
+                mark(anim.draw(screen))
+
+            # Draw everything
+            self.draw_entities(screen, game, alpha)
+            if game.portal:  # Make sure portal is always drawn if it exists
+                mark(game.portal.draw(screen))
+            for onion in game.onions:  # Draw onions
+                mark(onion.draw(screen))
+
+            # HUD on top of everything
+            mark(self.hud.draw(screen, game))
+
+        elif game.game_state == GAME_OVER:
+            game_over_text = render_text(font, f"Game Over! Final Score: {game.score}", WHITE)
+            restart_text = render_text(font, "Press SPACE to Restart", WHITE)
+            mark(screen.blit(game_over_text, (WINDOW_WIDTH//2 - game_over_text.get_width()//2, WINDOW_HEIGHT//2)))
+            mark(screen.blit(restart_text, (WINDOW_WIDTH//2 - restart_text.get_width()//2, WINDOW_HEIGHT//2 + 50)))
+
+        elif game.game_state == PAUSED and not self.pause_frozen:
+            # Draw the game state as it was, once, then keep it
+            self.draw_entities(screen, game, alpha)
+            mark(self.hud.draw_player(screen, shrek))
+            if game.boss:
+                mark(self.hud.draw_boss(screen, game.boss))
 
             # Draw wave number and score as they were
-            wave_text = font.render(f"Wave {current_wave}", True, WHITE)
-            screen.blit(wave_text, (10, 40))
-            score_text = f"Score: {score}"
-            shadow = font.render(score_text, True, BLACK)
-            text = font.render(score_text, True, WHITE)
-            screen.blit(shadow, (12, 12))
-            screen.blit(text, (10, 10))
+            wave_text = render_text(font, f"Wave {game.current_wave}", WHITE)
+            mark(screen.blit(wave_text, (10, 40)))
+            score_text = f"Score: {game.score}"
+            shadow = render_text(font, score_text, BLACK)
+            text = render_text(font, score_text, WHITE)
+            mark(screen.blit(shadow, (12, 12)))
+            mark(screen.blit(text, (10, 10)))
 
             # Add semi-transparent overlay
-            screen.blit(pause_overlay, (0, 0))
+            mark(self.pause_overlay.draw(screen, 128))
 
             # Draw pause menu
-            pause_title = font.render("PAUSED", True, WHITE)
-            resume_text = font.render("Press P to Resume", True, WHITE)
-            controls_reminder = font.render("Controls:", True, WHITE)
-            move_text = font.render("WASD/Arrows - Move", True, WHITE)
-            attack_text = font.render("Q - Punch  R - Kick  E - Fart", True, WHITE)
-            donkey_text = font.render("SPACE - Summon Donkey when Meter Full", True, WHITE)
+            pause_title = render_text(font, "PAUSED", WHITE)
+            resume_text = render_text(font, "Press P to Resume", WHITE)
+            controls_reminder = render_text(font, "Controls:", WHITE)
+            move_text = render_text(font, "WASD/Arrows - Move", WHITE)
+            attack_text = render_text(font, "Q - Punch  R - Kick  E - Fart", WHITE)
+            donkey_text = render_text(font, "SPACE - Summon Donkey when Meter Full", WHITE)
 
             # Center and position all text elements
             center_x = WINDOW_WIDTH // 2
-            screen.blit(pause_title, (center_x - pause_title.get_width()//2, WINDOW_HEIGHT//3))
-            screen.blit(resume_text, (center_x - resume_text.get_width()//2, WINDOW_HEIGHT//3 + 50))
-            screen.blit(controls_reminder, (center_x - controls_reminder.get_width()//2, WINDOW_HEIGHT//3 + 100))
-            screen.blit(move_text, (center_x - move_text.get_width()//2, WINDOW_HEIGHT//3 + 130))
-            screen.blit(attack_text, (center_x - attack_text.get_width()//2, WINDOW_HEIGHT//3 + 160))
-            screen.blit(donkey_text, (center_x - donkey_text.get_width()//2, WINDOW_HEIGHT//3 + 190))
-
-        elif game_state == VICTORY:
-            # Draw swamp background for victory scene
-            screen.blit(SWAMP_BACKGROUND, (0, 0))
-            
+            mark(screen.blit(pause_title, (center_x - pause_title.get_width()//2, WINDOW_HEIGHT//3)))
+            mark(screen.blit(resume_text, (center_x - resume_text.get_width()//2, WINDOW_HEIGHT//3 + 50)))
+            mark(screen.blit(controls_reminder, (center_x - controls_reminder.get_width()//2, WINDOW_HEIGHT//3 + 100)))
+            mark(screen.blit(move_text, (center_x - move_text.get_width()//2, WINDOW_HEIGHT//3 + 130)))
+            mark(screen.blit(attack_text, (center_x - attack_text.get_width()//2, WINDOW_HEIGHT//3 + 160)))
+            mark(screen.blit(donkey_text, (center_x - donkey_text.get_width()//2, WINDOW_HEIGHT//3 + 190)))
+            self.pause_frame.blit(screen, (0, 0))
+            self.pause_frozen = True
+
+        elif game.game_state == VICTORY:
             # Draw score
-            score_text = font.render(f"Final Score: {score}", True, WHITE)
-            screen.blit(score_text, (10, 10))
+            score_text = render_text(font, f"Final Score: {game.score}", WHITE)
+            mark(screen.blit(score_text, (10, 10)))
 
-            if victory_stage == 0:
+            if game.victory_stage == 0:
                 # Initial victory message
-                victory_text = font.render("YOU WIN!", True, WHITE)
-                subtitle = font.render("Time to go home...", True, WHITE)
-                screen.blit(victory_text, (WINDOW_WIDTH//2 - victory_text.get_width()//2, WINDOW_HEIGHT//3))
-                screen.blit(subtitle, (WINDOW_WIDTH//2 - subtitle.get_width()//2, WINDOW_HEIGHT//3 + 50))
-                
-                victory_timer += 1
-                if victory_timer > 180:  # Show message for 3 seconds
-                    victory_stage = 1
-                    victory_timer = 0
-
-            elif victory_stage == 1:
-                # Move Shrek towards home
-                if shrek.move_towards_home():
-                    victory_stage = 2
-                    victory_timer = 0
+                victory_text = render_text(font, "YOU WIN!", WHITE)
+                subtitle = render_text(font, "Time to go home...", WHITE)
+                mark(screen.blit(victory_text, (WINDOW_WIDTH//2 - victory_text.get_width()//2, WINDOW_HEIGHT//3)))
+                mark(screen.blit(subtitle, (WINDOW_WIDTH//2 - subtitle.get_width()//2, WINDOW_HEIGHT//3 + 50)))
 
+            elif game.victory_stage == 1:
                 # Draw Shrek at current position
-                screen.blit(shrek.sprite_right if shrek.home_x > shrek.victory_x else shrek.sprite_left,
-                          (shrek.victory_x, shrek.victory_y))
+                mark(screen.blit(shrek.sprite_right if shrek.home_x > shrek.victory_x else shrek.sprite_left,
+                               (shrek.victory_x, shrek.victory_y)))
 
             else:  # victory_stage == 2
                 # Draw Shrek at final position
-                screen.blit(shrek.sprite_right, (shrek.home_x - 30, shrek.home_y - 40))
+                mark(screen.blit(shrek.sprite_right, (shrek.home_x - 30, shrek.home_y - 40)))
 
                 # Final message with shadow for better visibility
-                final_text = font.render("Back in my swamp!", True, WHITE)
-                restart_text = font.render("Press SPACE to Play Again", True, WHITE)
-                
-                # Draw text shadows
-                shadow_text = font.render("Back in my swamp!", True, BLACK)
-                shadow_restart = font.render("Press SPACE to Play Again", True, BLACK)
-                
-                # Draw shadows slightly offset
-                screen.blit(shadow_text, (WINDOW_WIDTH//2 - final_text.get_width()//2 + 2, WINDOW_HEIGHT//3 + 2))
-                screen.blit(shadow_restart, (WINDOW_WIDTH//2 - restart_text.get_width()//2 + 2, WINDOW_HEIGHT//3 + 52))
-                
-                # Draw main text
-                screen.blit(final_text, (WINDOW_WIDTH//2 - final_text.get_width()//2, WINDOW_HEIGHT//3))
-                screen.blit(restart_text, (WINDOW_WIDTH//2 - restart_text.get_width()//2, WINDOW_HEIGHT//3 + 50))
+                mark(self.final_banner.draw_centered(screen, WINDOW_WIDTH//2, WINDOW_HEIGHT//3))
+                mark(self.play_again_banner.draw_centered(screen, WINDOW_WIDTH//2, WINDOW_HEIGHT//3 + 50))
+
+    def draw_entities(self, screen, game, alpha=1.0):
+        mark = self.mark
+        mark(game.shrek.draw(screen))
+        for enemy in game.enemies:
+            mark(enemy.draw(screen))
+        if game.boss:
+            mark(game.boss.draw(screen))
+        mark(PROJECTILE_POOL.draw(screen, alpha))
+        for cloud in game.fart_clouds:
+            mark(cloud.draw(screen))
+
+# Keys the game reads; each one is a bit in the replay's per-tick input masks
+REPLAY_KEYS = (pygame.K_LEFT, pygame.K_RIGHT, pygame.K_UP, pygame.K_DOWN,
+               pygame.K_a, pygame.K_d, pygame.K_w, pygame.K_s,
+               pygame.K_q, pygame.K_r, pygame.K_e, pygame.K_SPACE, pygame.K_p)
+REPLAY_MAGIC = b'SKRP'
+REPLAY_VERSION = 1
+REPLAY_KEYFRAME_INTERVAL = 10 * FPS  # One state snapshot every 10 seconds of play
+KEY_STATES = {}  # Decoded KeyState per held mask
+
+def encode_keys(keys, presses):
+    held = 0
+    pressed = 0
+    for bit, key in enumerate(REPLAY_KEYS):
+        if keys[key]:
+            held |= 1 << bit
+        if key in presses:
+            pressed |= 1 << bit
+    return held, pressed
+
+def decode_keys(held, pressed):
+    key_state = KEY_STATES.get(held)
+    if key_state is None:
+        key_state = KEY_STATES[held] = KeyState(key for bit, key in enumerate(REPLAY_KEYS) if held >> bit & 1)
+    return key_state, [key for bit, key in enumerate(REPLAY_KEYS) if pressed >> bit & 1]
+
+def shared_assets():
+    # Module-level art that snapshots refer to by name instead of copying pixels
+    assets = {}
+    for name in ('SHREK_RIGHT', 'SHREK_LEFT', 'TOILET_SPRITE', 'ONION_SPRITE',
+                 'BACKGROUND', 'SWAMP_BACKGROUND', 'SHREK_ANIMATION', 'TOILET_ANIMATION'):
+        asset = globals().get(name)
+        if asset is None:
+            continue
+        assets[id(asset)] = ('asset', name)
+        if isinstance(asset, AnimatedSprite) and asset.frames:
+            for i, frame in enumerate(asset.frames):
+                assets[id(frame)] = ('frame', name, i)
+    for (name, width, height), (source, scaled) in SCALED_ANIMATIONS.items():
+        if source is not globals().get(name):
+            continue
+        assets[id(scaled)] = ('scaled', name, width, height)
+        for i, frame in enumerate(scaled.frames or ()):
+            assets[id(frame)] = ('scaled_frame', name, width, height, i)
+    return assets
+
+class SnapshotPickler(pickle.Pickler):
+    def __init__(self, file):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.assets = shared_assets()
+
+    def persistent_id(self, obj):
+        if isinstance(obj, (pygame.Surface, AnimatedSprite)):
+            key = self.assets.get(id(obj))
+            if key:
+                return key
+            if isinstance(obj, pygame.Surface):
+                # One-off surface (e.g. a fallback sprite): store its pixels
+                return ('surface', obj.get_size(), pygame.image.tostring(obj, 'RGBA'))
+        return None
 
+class SnapshotUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        # Game classes resolve here whether this file ran as a script or was imported
+        if module in ('__main__', __name__):
+            return globals()[name]
+        return super().find_class(module, name)
+
+    def persistent_load(self, key):
+        if key[0] == 'asset':
+            return globals()[key[1]]
+        if key[0] == 'frame':
+            return globals()[key[1]].frames[key[2]]
+        if key[0] == 'scaled':
+            return get_scaled_animation(*key[1:])
+        if key[0] == 'scaled_frame':
+            return get_scaled_animation(*key[1:4]).frames[key[4]]
+        if key[0] == 'surface':
+            return pygame.image.fromstring(key[2], key[1], 'RGBA')
+        raise pickle.UnpicklingError(f"Unknown snapshot reference {key[0]!r}")
+
+def snapshot_state(game):
+    # Everything the simulation reads, compressed; shared art is stored by name
+    buffer = io.BytesIO()
+    SnapshotPickler(buffer).dump((game, PROJECTILE_POOL, RNG.getstate(), ANIMATION_CLOCK.time_ms))
+    return zlib.compress(buffer.getvalue())
+
+def restore_state(data):
+    game, pool, rng_state, animation_time = SnapshotUnpickler(io.BytesIO(zlib.decompress(data))).load()
+    PROJECTILE_POOL.__dict__.update(pool.__dict__)  # Keep the global pool object, swap its contents
+    RNG.setstate(rng_state)
+    ANIMATION_CLOCK.time_ms = animation_time
+    return game
+
+# A recorded session: seed, one input mask pair per tick and periodic state keyframes.
+# File layout: magic, version, header length, JSON header (with the keyframe index),
+# zlib-compressed input masks, then the compressed keyframes.
+class Replay:
+    def __init__(self, seed, keyframe_interval=REPLAY_KEYFRAME_INTERVAL):
+        self.seed = seed
+        self.keyframe_interval = keyframe_interval
+        self.held = array('H')
+        self.pressed = array('H')
+        self.keyframes = {}  # tick -> snapshot bytes, for keyframes in memory
+        self.keyframe_index = {}  # tick -> (offset, length) in the file
+        self.path = None
+
+    def __len__(self):
+        return len(self.held)
+
+    def record(self, held, pressed):
+        self.held.append(held)
+        self.pressed.append(pressed)
+
+    def add_keyframe(self, game):
+        self.keyframes[game.tick_count] = snapshot_state(game)
+
+    def keyframe_ticks(self):
+        return sorted(set(self.keyframes) | set(self.keyframe_index))
+
+    def keyframe(self, tick):
+        if tick in self.keyframes:
+            return self.keyframes[tick]
+        offset, length = self.keyframe_index[tick]
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def save(self, path):
+        inputs = array('H', self.held)
+        inputs.extend(self.pressed)
+        if sys.byteorder == 'big':
+            inputs.byteswap()  # Files are little-endian
+        input_data = zlib.compress(inputs.tobytes())
+
+        ticks = self.keyframe_ticks()
+        blobs = [self.keyframe(tick) for tick in ticks]
+        header = {'version': REPLAY_VERSION, 'seed': self.seed, 'fps': FPS,
+                  'ticks': len(self), 'keyframe_interval': self.keyframe_interval,
+                  'input_length': len(input_data), 'keyframes': []}
+        offset = 0
+        for tick, blob in zip(ticks, blobs):
+            header['keyframes'].append([tick, offset, len(blob)])
+            offset += len(blob)
+        header_data = json.dumps(header).encode('utf-8')
+
+        with open(path, 'wb') as f:
+            f.write(REPLAY_MAGIC)
+            f.write(struct.pack('<HI', REPLAY_VERSION, len(header_data)))
+            f.write(header_data)
+            f.write(input_data)
+            for blob in blobs:
+                f.write(blob)
+
+    @classmethod
+    def load(cls, path):
+        # Reads the header and inputs; keyframes stay on disk until a seek needs one
+        with open(path, 'rb') as f:
+            if f.read(4) != REPLAY_MAGIC:
+                raise ValueError(f"{path} is not a replay file")
+            version, header_length = struct.unpack('<HI', f.read(6))
+            if version != REPLAY_VERSION:
+                raise ValueError(f"Unsupported replay version {version}")
+            header = json.loads(f.read(header_length).decode('utf-8'))
+            input_data = f.read(header['input_length'])
+            keyframe_start = f.tell()
+
+        replay = cls(header['seed'], header['keyframe_interval'])
+        replay.path = path
+        inputs = array('H')
+        inputs.frombytes(zlib.decompress(input_data))
+        if sys.byteorder == 'big':
+            inputs.byteswap()
+        ticks = header['ticks']
+        replay.held = inputs[:ticks]
+        replay.pressed = inputs[ticks:]
+        for tick, offset, length in header['keyframes']:
+            replay.keyframe_index[tick] = (keyframe_start + offset, length)
+        return replay
+
+    def game_at(self, tick):
+        # Restore the nearest keyframe at or before tick, then simulate the rest of the way
+        tick = max(0, min(tick, len(self)))
+        start = max([t for t in self.keyframe_ticks() if t <= tick], default=None)
+        if start is None:
+            RNG.seed(self.seed)
+            ANIMATION_CLOCK.time_ms = 0
+            PROJECTILE_POOL.clear()
+            game = Game()
+        else:
+            game = restore_state(self.keyframe(start))
+        playback = ReplayInput(self)
+        while game.tick_count < tick and run_tick(game, playback):
+            pass
+        return game
+
+# Records what another input source does, one tick at a time, into a Replay
+class ReplayRecorder:
+    def __init__(self, source, game, replay):
+        self.source = source
+        self.game = game
+        self.replay = replay
+
+    def poll(self, tick):
+        if tick % self.replay.keyframe_interval == 0:
+            self.replay.add_keyframe(self.game)
+        keys, presses, quit_requested = self.source.poll(tick)
+        if quit_requested:
+            return keys, presses, True
+        held, pressed = encode_keys(keys, presses)
+        self.replay.record(held, pressed)
+        # Hand back exactly what a replay will see
+        key_state, presses = decode_keys(held, pressed)
+        return key_state, presses, False
+
+# Plays back a Replay's inputs
+class ReplayInput:
+    def __init__(self, replay):
+        self.replay = replay
+
+    def poll(self, tick):
+        if tick >= len(self.replay):
+            return KeyState(), [], True  # End of the recording
+        key_state, presses = decode_keys(self.replay.held[tick], self.replay.pressed[tick])
+        return key_state, presses, False
+
+async def wait_for_assets(view, clock, render_fps):
+    # Draw the loading title screen until the required assets are in; False if the window closed
+    while not ASSETS.ready:
+        ASSETS.poll()
+        # Drop input made while loading so it can't leak into the game
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                return False
+        view.draw_loading(screen, ASSETS)
         pygame.display.flip()
-        clock.tick(FPS)
+        clock.tick(render_fps)
         await asyncio.sleep(0)
-
-asyncio.run(main()) 
\ No newline at end of file
+    return True
+
+def run_tick(game, input_source, pump_window=False, hotkeys=None):
+    # Read one tick of input and advance the simulation; False once the game should quit
+    keys, presses, quit_requested = PERF.run('events', input_source.poll, game.tick_count)
+    if pump_window:
+        # Scripted input in a window still needs the window's own events handled.
+        # Drain every event, so ones we ignore can't fill the queue and crowd out QUIT.
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                quit_requested = True
+            elif event.type == pygame.KEYDOWN and hotkeys and event.key in hotkeys:
+                hotkeys[event.key]()
+    if quit_requested:
+        game.running = False
+        return False
+    for key in presses:
+        game.key_down(key)
+    game.update(keys)
+    ANIMATION_CLOCK.advance(1000 / FPS)
+    return True
+
+async def main(headless=HEADLESS, input_source=None, max_ticks=None, render_fps=FPS,
+               seed=None, record_path=None, replay_path=None, seek_tick=0, profile_frames=0,
+               dirty_rects=False):
+    view = None if headless else GameView(dirty_rects)
+    clock = pygame.time.Clock()
+    if view:
+        if not await wait_for_assets(view, clock, render_fps):
+            return None
+    else:
+        ASSETS.load_all()
+    if replay_path:
+        # Jump to the requested tick and play the recorded inputs from there
+        replay = Replay.load(replay_path)
+        game = replay.game_at(seek_tick)
+        input_source = ReplayInput(replay)
+    else:
+        RNG.seed(seed)
+        game = Game()
+    game.interpolate = not headless
+    timestep = FixedTimestep(FPS)
+    # Debug keys, kept out of the game's own input
+    hotkeys = {pygame.K_F3: PERF.toggle,
+               pygame.K_F4: lambda: PROFILER.start(profile_frames or PROFILE_FRAMES, game)}
+    if input_source is None:
+        # Headless runs have no keyboard, so play the demo script
+        input_source = ScriptedInput.demo() if headless else LiveInput(view.pause_button_rect, hotkeys)
+    recording = None
+    if record_path:
+        recording = Replay(RNG.base_seed)
+        input_source = ReplayRecorder(input_source, game, recording)
+    live = input_source.source if recording else input_source
+    pump_window = view is not None and not isinstance(live, LiveInput)
+    if profile_frames:
+        PROFILER.start(profile_frames, game)
+    start_tick = game.tick_count
+    start_time = time.perf_counter()
+
+    while game.running:
+        if view:
+            # Run however many fixed ticks this frame's time covers, then draw in between
+            frame_ms = clock.tick(render_fps)
+            if not ASSETS.finished:
+                ASSETS.poll()  # Cosmetic assets still arriving
+            if PERF.enabled:
+                PERF.end_frame(frame_ms)
+            for _ in range(timestep.advance(frame_ms)):
+                if not run_tick(game, input_source, pump_window, hotkeys):
+                    break
+                if max_ticks is not None and game.tick_count >= max_ticks:
+                    game.running = False
+                    break
+            if not game.running:
+                break
+            PERF.run('draw', view.draw, screen, game, timestep.alpha)
+            PERF.run('flip', view.present)
+            PROFILER.end_frame()
+            await asyncio.sleep(0)
+        else:
+            # Uncapped: tick as fast as possible
+            if not run_tick(game, input_source):
+                break
+            PROFILER.end_frame()
+            if max_ticks is not None and game.tick_count >= max_ticks:
+                break
+
+    elapsed = time.perf_counter() - start_time
+    if PROFILER.active:
+        PROFILER.finish()  # Game ended mid-capture; keep what we have
+    if recording:
+        recording.save(record_path)
+        print(f"Saved replay of {len(recording)} ticks to {record_path}")
+    ticks_run = game.tick_count - start_tick
+    ticks_per_second = ticks_run / elapsed if elapsed > 0 else 0.0
+    if headless:
+        print(f"Simulated {ticks_run} ticks in {elapsed:.2f}s ({ticks_per_second:.0f} ticks/s), "
+              f"wave {game.current_wave}, score {game.score}")
+    return {'ticks': ticks_run, 'seconds': elapsed, 'ticks_per_second': ticks_per_second,
+            'score': game.score, 'wave': game.current_wave}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Skibidi Shrek Swamp Showdown")
+    parser.add_argument('--headless', action='store_true',
+                        help="run the simulation without a window, as fast as possible")
+    parser.add_argument('--ticks', type=int, default=None,
+                        help="stop after this many simulation ticks (headless default: 10000)")
+    parser.add_argument('--render-fps', type=int, default=FPS,
+                        help=f"frames drawn per second; the simulation always runs at {FPS} Hz")
+    parser.add_argument('--seed', type=int, default=None,
+                        help="seed for the game's random streams")
+    parser.add_argument('--record', metavar='PATH',
+                        help="record the session's inputs to a replay file")
+    parser.add_argument('--replay', metavar='PATH',
+                        help="play back a replay file (in the window, or with --headless)")
+    parser.add_argument('--seek', type=int, default=0, metavar='TICK',
+                        help="start the replay at this tick")
+    parser.add_argument('--profile', type=int, default=0, metavar='FRAMES',
+                        help=f"profile the first FRAMES frames with cProfile into {PROFILE_DIR}/ "
+                             f"(F4 profiles the next {PROFILE_FRAMES} frames, or FRAMES if given)")
+    parser.add_argument('--dirty-rects', action='store_true',
+                        help="redraw and update only the changed parts of the screen")
+    args, _ = parser.parse_known_args()
+    if args.ticks is None and HEADLESS and not args.replay:
+        args.ticks = 10000
+    asyncio.run(main(max_ticks=args.ticks, render_fps=args.render_fps, seed=args.seed,
+                     record_path=args.record, replay_path=args.replay, seek_tick=args.seek,
+                     profile_frames=args.profile, dirty_rects=args.dirty_rects))
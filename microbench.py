@@ -0,0 +1,187 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+# Run the game module without a window
+os.environ['SKIBIDI_HEADLESS'] = '1'
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+os.environ['SDL_AUDIODRIVER'] = 'dummy'
+
+import pygame
+
+import main as game_module
+
+SEED = 1234
+
+# Each benchmark builds its objects once and returns the call to time.
+# Objects are put in a typical mid-game state so the common path is measured.
+def bench_toilet_draw(surface):
+    toilet = game_module.SkibidiToilet()
+    toilet.x, toilet.y = 300, 200
+    toilet.health = 20  # Damaged, so the health bar is drawn too
+    return lambda: toilet.draw(surface)
+
+def bench_gunner_move(surface):
+    shrek = game_module.Shrek()
+    gunner = game_module.GunnerSkibidi()
+    gunner.x, gunner.y = 500, 300
+    gunner.target_player = shrek
+    return gunner.move
+
+def bench_boss_draw(surface):
+    boss = game_module.SkibidiBoss()
+    boss.x, boss.y = 300, 150
+    return lambda: boss.draw(surface)
+
+def bench_onion_draw(surface):
+    onion = game_module.Onion(400, 300)
+    return lambda: onion.draw(surface)
+
+def bench_fart_cloud_draw(surface):
+    cloud = game_module.FartCloud(400, 300)
+    for _ in range(15):  # Part-way through its expansion
+        cloud.update()
+    return lambda: cloud.draw(surface)
+
+def bench_donkey_draw(surface):
+    donkey = game_module.Donkey(300, 300)
+    return lambda: donkey.draw(surface, game_module.SHREK_RIGHT, game_module.SHREK_LEFT)
+
+def bench_attack_animation_draw(surface):
+    animation = game_module.AttackAnimation(300, 300, 'punch', True)
+    animation.frame = 5
+    return lambda: animation.draw(surface)
+
+def bench_portal_update(surface):
+    portal = game_module.Portal(400, 300)
+    return portal.update
+
+def bench_shrek_draw(surface):
+    shrek = game_module.Shrek()
+    shrek.poop_stain_timer = 60  # Mid-fade stain overlay
+    shrek.donkey_charge = 50
+    return lambda: shrek.draw(surface)
+
+def bench_hud_draw(surface):
+    view = game_module.GameView()
+    game = game_module.Game()
+    game.game_state = game_module.PLAYING
+    game.boss = game_module.SkibidiBoss()
+    game.shrek.health = 50
+    return lambda: view.hud.draw(surface, game)
+
+def bench_jungle_background(surface):
+    game_module.create_jungle_background()  # Make sure the disk cache exists, so this measures a load
+    return game_module.create_jungle_background
+
+def bench_jungle_generate(surface):
+    size = (game_module.WINDOW_WIDTH, game_module.WINDOW_HEIGHT)
+    return lambda: game_module.generate_jungle_background(SEED, size)
+
+BENCHMARKS = {
+    'SkibidiToilet.draw': bench_toilet_draw,
+    'GunnerSkibidi.move': bench_gunner_move,
+    'SkibidiBoss.draw': bench_boss_draw,
+    'Onion.draw': bench_onion_draw,
+    'FartCloud.draw': bench_fart_cloud_draw,
+    'Donkey.draw': bench_donkey_draw,
+    'AttackAnimation.draw': bench_attack_animation_draw,
+    'Portal.update': bench_portal_update,
+    'Shrek.draw': bench_shrek_draw,
+    'Hud.draw': bench_hud_draw,
+    'create_jungle_background': bench_jungle_background,
+    'generate_jungle_background': bench_jungle_generate,
+}
+
+def calibrate(func, target_seconds):
+    # Find a call count that takes about target_seconds per repeat
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= target_seconds / 10 or number >= 1 << 20:
+            return max(1, int(number * target_seconds / max(elapsed, 1e-9)))
+        number *= 10
+
+def measure(name, repeats, target_seconds):
+    game_module.RNG.seed(SEED)
+    game_module.PROJECTILE_POOL.clear()
+    surface = pygame.Surface((game_module.WINDOW_WIDTH, game_module.WINDOW_HEIGHT))
+    func = BENCHMARKS[name](surface)
+    number = calibrate(func, target_seconds)
+
+    rates = []
+    for _ in range(repeats):
+        game_module.PROJECTILE_POOL.clear()  # Don't let gunner shots pile up between repeats
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        rates.append(number / elapsed)
+    # The median is robust to the odd repeat hit by scheduling noise
+    median = statistics.median(rates)
+    spread = statistics.stdev(rates) / median if len(rates) > 1 else 0.0
+    return {'ops_per_sec': median, 'best_ops_per_sec': max(rates), 'rel_stdev': spread,
+            'calls_per_repeat': number, 'repeats': repeats}
+
+def compare(results, baseline, threshold):
+    # A method regresses when its median ops/sec falls by more than threshold
+    regressions = []
+    for name, result in results['benchmarks'].items():
+        base = baseline.get('benchmarks', {}).get(name)
+        if not base:
+            continue
+        old = base['ops_per_sec']
+        new = result['ops_per_sec']
+        change = (new - old) / old if old > 0 else 0.0
+        marker = ''
+        if change < -threshold:
+            marker = '  REGRESSION'
+            regressions.append(name)
+        print(f"{name:<26} {old:14,.0f} -> {new:14,.0f} ops/s ({change:+.1%}){marker}")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-method micro-benchmarks for Skibidi Shrek")
+    parser.add_argument('--only', action='append', choices=sorted(BENCHMARKS),
+                        help="benchmark to run (repeatable; default: all)")
+    parser.add_argument('--repeats', type=int, default=7, help="timed repeats per method")
+    parser.add_argument('--seconds', type=float, default=0.2, help="target length of one repeat")
+    parser.add_argument('--output', default='microbench_results.json', help="where to write the JSON results")
+    parser.add_argument('--baseline', help="earlier results file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="allowed ops/sec drop against the baseline (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    results = {
+        'meta': {
+            'python': platform.python_version(),
+            'pygame': pygame.version.ver,
+            'platform': platform.platform(),
+            'repeats': args.repeats,
+        },
+        'benchmarks': {},
+    }
+    print(f"{'method':<26} {'ops/sec':>14} {'+/-':>7}")
+    for name in args.only or list(BENCHMARKS):
+        result = measure(name, args.repeats, args.seconds)
+        results['benchmarks'][name] = result
+        print(f"{name:<26} {result['ops_per_sec']:14,.0f} {result['rel_stdev']:6.1%}")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"Regressed past {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Run the game module without a window, from the repository root
+os.environ['SKIBIDI_HEADLESS'] = '1'
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+os.environ['SDL_AUDIODRIVER'] = 'dummy'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
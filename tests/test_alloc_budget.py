@@ -0,0 +1,90 @@
+import pytest
+
+import benchmark
+import pygame
+
+game_module = benchmark.game_module
+
+FRAMES = 300
+
+# Counts Surfaces made while frames run. tracemalloc can't see these: the pixels
+# live in SDL's heap, so a full-screen surface per frame barely moves its numbers.
+class SurfaceCounter:
+    def __init__(self, monkeypatch):
+        self.count = 0
+        self.retained = 0  # Depth inside a retained widget's re-render
+        counter = self
+        base = pygame.Surface
+
+        class CountingSurface(base):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                counter.created()
+
+        monkeypatch.setattr(pygame, 'Surface', CountingSurface)
+        for name in ('scale', 'smoothscale', 'rotate', 'rotozoom', 'flip'):
+            monkeypatch.setattr(pygame.transform, name, self.counted(getattr(pygame.transform, name)))
+        monkeypatch.setattr(game_module.TEXT_CACHE, 'render', self.counted_text(game_module.TEXT_CACHE.render))
+        # Widgets that re-render only when their value changes may make new surfaces
+        monkeypatch.setattr(game_module.HudWidget, 'draw', self.allowed(game_module.HudWidget.draw))
+        monkeypatch.setattr(game_module.OutlinedText, 'set_text', self.allowed(game_module.OutlinedText.set_text))
+
+    def created(self):
+        if not self.retained:
+            self.count += 1
+
+    def counted(self, func):
+        def wrapper(*args, **kwargs):
+            self.created()
+            return func(*args, **kwargs)
+        return wrapper
+
+    def counted_text(self, render):
+        cache = game_module.TEXT_CACHE
+        def wrapper(*args, **kwargs):
+            misses = cache.misses
+            surface = render(*args, **kwargs)
+            if cache.misses != misses:
+                self.created()
+            return surface
+        return wrapper
+
+    def allowed(self, method):
+        def wrapper(*args, **kwargs):
+            self.retained += 1
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.retained -= 1
+        return wrapper
+
+def run_frame(view, game, input_source, invincible):
+    benchmark.step(game, input_source, invincible)
+    view.draw(game_module.screen, game)
+    view.present()
+
+@pytest.mark.parametrize('dirty_rects', [False, True])
+@pytest.mark.parametrize('name', sorted(benchmark.SCENARIOS))
+def test_no_surfaces_per_frame(monkeypatch, name, dirty_rects):
+    view = game_module.GameView(dirty_rects)
+    game, input_source, invincible = benchmark.new_game(name)
+    for _ in range(benchmark.WARMUP_TICKS):  # Fill the lazy caches first
+        run_frame(view, game, input_source, invincible)
+
+    counter = SurfaceCounter(monkeypatch)
+    for _ in range(FRAMES):
+        run_frame(view, game, input_source, invincible)
+    assert counter.count == 0, f"{name} made {counter.count} surfaces in {FRAMES} frames after warm-up"
+
+@pytest.mark.parametrize('name', sorted(benchmark.SCENARIOS))
+def test_alloc_budget(name):
+    view = game_module.GameView()
+    allocated = benchmark.measure_allocations(name, FRAMES, view)
+    assert allocated['p95'] <= benchmark.ALLOC_BUDGET, \
+        f"{name} allocates {allocated['p95']:.0f} bytes/frame at p95, budget {benchmark.ALLOC_BUDGET}"
+
+def test_entities_have_no_dict():
+    # Slotted entities stay slotted: a stray attribute would bring the __dict__ back
+    game_module.RNG.seed(benchmark.SEED)
+    for name, create in benchmark.ENTITIES.items():
+        assert not hasattr(create(), '__dict__'), f"{name} has a per-instance __dict__"
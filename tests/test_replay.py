@@ -0,0 +1,92 @@
+import pytest
+
+import main as game_module
+
+SEED = 7
+TICKS = 6000
+KEYFRAME_INTERVAL = 1000
+
+def state(game):
+    shrek = game.shrek
+    return (game.tick_count, game.score, game.current_wave, game.game_state,
+            shrek.x, shrek.y, shrek.health, len(game.enemies), game_module.PROJECTILE_POOL.count)
+
+def play(game, input_source, until):
+    while game.tick_count < until and game_module.run_tick(game, input_source):
+        pass
+    return game
+
+@pytest.fixture(scope='module')
+def recording(tmp_path_factory):
+    # Record a demo session headless, noting the state at every keyframe tick
+    game_module.ASSETS.load_all()
+    game_module.RNG.seed(SEED)
+    game_module.PROJECTILE_POOL.clear()
+    game_module.ANIMATION_CLOCK.time_ms = 0
+    game = game_module.Game()
+    replay = game_module.Replay(game_module.RNG.base_seed, KEYFRAME_INTERVAL)
+    recorder = game_module.ReplayRecorder(game_module.ScriptedInput.demo(), game, replay)
+    states = {}
+    while game.tick_count < TICKS:
+        if game.tick_count % KEYFRAME_INTERVAL == 0:
+            states[game.tick_count] = state(game)
+        assert game_module.run_tick(game, recorder)
+    states[TICKS] = state(game)
+
+    path = tmp_path_factory.mktemp('replay') / 'demo.skrp'
+    replay.save(str(path))
+    return str(path), states
+
+def test_header_and_inputs_round_trip(recording):
+    path, states = recording
+    replay = game_module.Replay.load(path)
+    assert replay.seed == SEED
+    assert len(replay) == TICKS
+    assert replay.keyframe_ticks() == list(range(0, TICKS, KEYFRAME_INTERVAL))
+    assert not replay.keyframes  # Keyframes stay on disk until a seek reads one
+
+def test_playback_matches_recording(recording):
+    path, states = recording
+    replay = game_module.Replay.load(path)
+    game = play(replay.game_at(0), game_module.ReplayInput(replay), TICKS)
+    assert state(game) == states[TICKS]
+
+@pytest.mark.parametrize('tick', [KEYFRAME_INTERVAL * 3, KEYFRAME_INTERVAL * 5])
+def test_seek_to_keyframe(recording, tick):
+    path, states = recording
+    replay = game_module.Replay.load(path)
+    game = replay.game_at(tick)
+    assert state(game) == states[tick]
+    # Playing on from the keyframe ends where the recording did
+    game = play(game, game_module.ReplayInput(replay), TICKS)
+    assert state(game) == states[TICKS]
+
+def test_seek_between_keyframes(recording):
+    path, states = recording
+    replay = game_module.Replay.load(path)
+    game = play(replay.game_at(TICKS - 250), game_module.ReplayInput(replay), TICKS)
+    assert state(game) == states[TICKS]
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / 'not_a_replay.skrp'
+    path.write_bytes(b'GIF89a' + bytes(32))
+    with pytest.raises(ValueError):
+        game_module.Replay.load(str(path))
+
+def test_window_events_drained_during_playback():
+    # Events nothing handles must not pile up and crowd out a later QUIT or hotkey
+    pygame = game_module.pygame
+    game_module.RNG.seed(SEED)
+    game = game_module.Game()
+    input_source = game_module.ScriptedInput.demo()
+    pressed = []
+    hotkeys = {pygame.K_F3: lambda: pressed.append(pygame.K_F3)}
+    pygame.event.get()
+    for _ in range(100):
+        pygame.event.post(pygame.event.Event(pygame.KEYUP, key=pygame.K_a))
+        assert game_module.run_tick(game, input_source, True, hotkeys)
+    assert not pygame.event.get()
+    pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_F3))
+    pygame.event.post(pygame.event.Event(pygame.QUIT))
+    assert not game_module.run_tick(game, input_source, True, hotkeys)
+    assert pressed == [pygame.K_F3]
@@ -0,0 +1,38 @@
+import os
+
+import pytest
+
+import main as game_module
+
+pytest.importorskip('PIL')  # Needed to decode the GIF again
+
+GIF_PATH = os.path.join(game_module.ASSET_DIR, 'images', 'Bigblackshrek.gif')
+SCALE = 0.5
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(game_module, 'SPRITE_CACHE_DIR', str(tmp_path))
+    return tmp_path
+
+def test_cache_round_trip(cache_dir):
+    decoded = game_module.AnimatedSprite(GIF_PATH, SCALE)
+    cached = game_module.AnimatedSprite(GIF_PATH, SCALE)
+    assert cached.frames and len(cached.frames) == len(decoded.frames)
+    assert cached.frame_durations == decoded.frame_durations
+    for a, b in zip(decoded.frames, cached.frames):
+        assert game_module.pygame.image.tostring(a, 'RGBA') == game_module.pygame.image.tostring(b, 'RGBA')
+
+@pytest.mark.parametrize('keep', [6, 12, 200, -100])
+def test_truncated_cache_decodes_again(cache_dir, keep):
+    decoded = game_module.AnimatedSprite(GIF_PATH, SCALE)
+    cache_path = game_module.sprite_cache_path(GIF_PATH, SCALE)
+    with open(cache_path, 'rb') as f:
+        data = f.read()
+    with open(cache_path, 'wb') as f:
+        f.write(data[:keep])  # Cut off in the header, the JSON or the pixels
+
+    sprite = game_module.AnimatedSprite(GIF_PATH, SCALE)
+    assert sprite.frames and len(sprite.frames) == len(decoded.frames)
+    # The damaged file was replaced by a good one
+    digest = game_module.file_digest(GIF_PATH)
+    assert game_module.read_sprite_cache(cache_path, digest, SCALE) is not None